@@ -0,0 +1,98 @@
+"""Measure recall@k and latency of the ANN index against an exact (brute-force) scan.
+
+Queries are embeddings of chunks sampled from the corpus already in the
+database (DATABASE_URL), so build the index first. Run from the backend
+directory:
+    python -m benchmarks.bench_ann_recall --queries 200 --k 10 --ef-search 20,40,100,250
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from database import async_session
+from services.vector_index import index_status
+
+SEARCH_SQL = text("""
+    SELECT id FROM document_chunks
+    WHERE embedding IS NOT NULL
+    ORDER BY embedding <=> :embedding
+    LIMIT :k
+""")
+
+
+async def _sample_queries(count: int) -> list[np.ndarray]:
+    async with async_session() as db:
+        result = await db.execute(
+            text("SELECT embedding FROM document_chunks WHERE embedding IS NOT NULL ORDER BY random() LIMIT :n"),
+            {"n": count},
+        )
+        return [row[0] for row in result]
+
+
+async def _search(embedding: np.ndarray, k: int, settings_sql: list[str]) -> tuple[list, float]:
+    async with async_session() as db:
+        for statement in settings_sql:
+            await db.execute(text(statement))
+        start = time.perf_counter()
+        result = await db.execute(SEARCH_SQL, {"embedding": embedding, "k": k})
+        ids = [row[0] for row in result]
+        return ids, time.perf_counter() - start
+
+
+def _report(label: str, recalls: list[float], latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+    print(
+        f"{label:<18} recall {statistics.mean(recalls):6.3f}  "
+        f"p50 {statistics.median(latencies) * 1000:8.2f}ms  p95 {p95 * 1000:8.2f}ms"
+    )
+
+
+async def main(queries: int, k: int, ef_values: list[int], probe_values: list[int]) -> None:
+    status = await index_status()
+    if not status["index"]:
+        raise SystemExit("No vector index found; build one first")
+    definition = status["index"]["definition"]
+    print(definition)
+
+    samples = await _sample_queries(queries)
+    exact_sql = ["SET LOCAL enable_indexscan = off", "SET LOCAL enable_bitmapscan = off"]
+    exact, exact_times = [], []
+    for embedding in samples:
+        ids, elapsed = await _search(embedding, k, exact_sql)
+        exact.append(set(ids))
+        exact_times.append(elapsed)
+    _report("exact", [1.0] * len(samples), exact_times)
+
+    if "hnsw" in definition:
+        sweep = [(f"ef_search={ef}", f"SET LOCAL hnsw.ef_search = {ef}") for ef in ef_values]
+    else:
+        sweep = [(f"probes={p}", f"SET LOCAL ivfflat.probes = {p}") for p in probe_values]
+
+    for label, statement in sweep:
+        recalls, latencies = [], []
+        for embedding, truth in zip(samples, exact):
+            ids, elapsed = await _search(embedding, k, [statement])
+            recalls.append(len(truth & set(ids)) / len(truth) if truth else 1.0)
+            latencies.append(elapsed)
+        _report(label, recalls, latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", default="20,40,100,250")
+    parser.add_argument("--probes", default="1,4,10,32")
+    args = parser.parse_args()
+    asyncio.run(main(
+        args.queries,
+        args.k,
+        [int(v) for v in args.ef_search.split(",")],
+        [int(v) for v in args.probes.split(",")],
+    ))
@@ -0,0 +1,82 @@
+"""Compare chunk insert throughput: per-row ORM adds vs. ChunkWriter binary COPY.
+
+Needs a running database (DATABASE_URL). Run from the backend directory:
+    python -m benchmarks.bench_chunk_insert --rows 3000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+from sqlalchemy import delete
+
+from config import settings
+from database import async_session, init_db
+from models import Document, DocumentChunk
+from services.chunk_writer import ChunkWriter
+from services.document_processor import TextChunk
+
+
+def _synthetic_rows(count: int) -> list[tuple[TextChunk, list[float]]]:
+    rng = random.Random(0)
+    chunk = TextChunk(content="The parties agree to the following terms. " * 60, page_number=1, section=None, token_count=480)
+    return [(chunk, [rng.random() for _ in range(settings.embedding_dimensions)]) for _ in range(count)]
+
+
+async def _new_document(db) -> uuid.UUID:
+    doc = Document(filename="bench.pdf", file_type="pdf", file_path="/dev/null", file_size=0, status="failed")
+    db.add(doc)
+    await db.commit()
+    return doc.id
+
+
+async def _orm_insert(rows) -> float:
+    async with async_session() as db:
+        doc_id = await _new_document(db)
+        start = time.perf_counter()
+        for idx, (chunk, embedding) in enumerate(rows):
+            db.add(DocumentChunk(
+                document_id=doc_id,
+                chunk_index=idx,
+                content=chunk.content,
+                page_number=chunk.page_number,
+                section=chunk.section,
+                token_count=chunk.token_count,
+                embedding=embedding,
+            ))
+        await db.commit()
+        elapsed = time.perf_counter() - start
+        await db.execute(delete(Document).where(Document.id == doc_id))
+        await db.commit()
+    return elapsed
+
+
+async def _copy_insert(rows) -> float:
+    async with async_session() as db:
+        doc_id = await _new_document(db)
+        start = time.perf_counter()
+        writer = ChunkWriter(db)
+        for idx, (chunk, embedding) in enumerate(rows):
+            await writer.add(doc_id, idx, chunk, embedding)
+        await writer.flush()
+        await db.commit()
+        elapsed = time.perf_counter() - start
+        await db.execute(delete(Document).where(Document.id == doc_id))
+        await db.commit()
+    return elapsed
+
+
+async def main(rows: int) -> None:
+    await init_db()
+    data = _synthetic_rows(rows)
+    for label, run in (("ORM db.add", _orm_insert), ("ChunkWriter COPY", _copy_insert)):
+        elapsed = await run(data)
+        print(f"{label:<18} {elapsed:8.2f}s  {rows / elapsed:10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=3000)
+    asyncio.run(main(parser.parse_args().rows))
@@ -0,0 +1,77 @@
+"""Micro-benchmark chunk_text against the previous re-encoding implementation.
+
+Run from the backend directory:
+    python -m benchmarks.bench_chunking --pages 1000
+"""
+
+import argparse
+import re
+import time
+
+from config import settings
+from benchmarks.synthetic import synthetic_pages
+from services.document_processor import TextChunk, _detect_section_header, chunk_text
+from utils import count_tokens
+
+
+def _legacy_overlap(text: str, overlap_tokens: int) -> str:
+    words = text.split()
+    word_count = int(overlap_tokens * 0.75)
+    if word_count <= 0 or word_count >= len(words):
+        return text
+    return " ".join(words[-word_count:])
+
+
+def legacy_chunk_text(pages: list[dict], target: int, overlap: int) -> list[TextChunk]:
+    """The per-paragraph count_tokens implementation chunk_text replaced."""
+    segments = []
+    for page in pages:
+        for para in [p.strip() for p in re.split(r"\n\s*\n|\n(?=[A-Z\d])", page["text"]) if p.strip()]:
+            segments.append({"text": para, "page_number": page["page_number"], "tokens": count_tokens(para)})
+
+    chunks = []
+    current_text, current_tokens = "", 0
+    current_page, current_section = segments[0]["page_number"], None
+    for seg in segments:
+        current_section = _detect_section_header(seg["text"]) or current_section
+        if current_tokens > 0 and current_tokens + seg["tokens"] > target:
+            chunks.append(TextChunk(current_text.strip(), current_page, current_section, current_tokens))
+            current_text = _legacy_overlap(current_text, overlap) + "\n\n" + seg["text"]
+            current_tokens = count_tokens(current_text)
+        else:
+            current_text += ("\n\n" if current_text else "") + seg["text"]
+            current_tokens += seg["tokens"]
+        current_page = seg["page_number"] or current_page
+    if current_text.strip():
+        chunks.append(TextChunk(current_text.strip(), current_page, current_section, count_tokens(current_text.strip())))
+    return chunks
+
+
+def _time(fn, repeat: int) -> tuple[float, list]:
+    best, result = float("inf"), []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = synthetic_pages(args.pages)
+    target, overlap = settings.chunk_target_tokens, settings.chunk_overlap_tokens
+
+    legacy_time, legacy = _time(lambda: legacy_chunk_text(pages, target, overlap), args.repeat)
+    new_time, new = _time(lambda: chunk_text(pages, target, overlap), args.repeat)
+
+    print(f"legacy      {legacy_time:8.3f}s  {args.pages / legacy_time:8.0f} pages/s  {len(legacy)} chunks")
+    print(f"single-pass {new_time:8.3f}s  {args.pages / new_time:8.0f} pages/s  {len(new)} chunks")
+    print(f"speedup     {legacy_time / new_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
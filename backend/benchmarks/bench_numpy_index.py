@@ -0,0 +1,56 @@
+"""Measure NumpyVectorIndex query latency over a synthetic corpus.
+
+Builds a throwaway index of random unit vectors in a temp directory (about
+6 GB on disk for 1M rows at 1536 dimensions). Run from the backend directory:
+    python -m benchmarks.bench_numpy_index --rows 1000000 --queries 50
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from config import settings
+from services.numpy_index import NumpyVectorIndex
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=16)
+    parser.add_argument("--batch", type=int, default=50_000)
+    args = parser.parse_args()
+
+    dims = settings.embedding_dimensions
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = NumpyVectorIndex(f"{tmp}/index", dims)
+        start = time.perf_counter()
+        for offset in range(0, args.rows, args.batch):
+            n = min(args.batch, args.rows - offset)
+            doc_ids = [uuid.uuid4()] * n
+            rows = index.add([uuid.uuid4() for _ in range(n)], doc_ids, rng.standard_normal((n, dims), dtype=np.float32))
+            index.activate(rows)
+        print(f"built {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+        # Reopen so queries run against the memory map, as after a restart
+        index = NumpyVectorIndex(f"{tmp}/index", dims)
+        latencies = []
+        for _ in range(args.queries):
+            query = rng.standard_normal(dims, dtype=np.float32)
+            start = time.perf_counter()
+            index.search(query, args.k)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(
+            f"search k={args.k}: p50 {statistics.median(latencies) * 1000:.1f}ms  "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Compare PDF parse+chunk throughput: single-threaded vs. the process pool.
+
+Run from the backend directory:
+    python -m benchmarks.bench_parsing --pages 600 --workers 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from config import settings
+from benchmarks.synthetic import write_synthetic_pdf
+from services import parse_pool
+from services.document_processor import parse_and_chunk
+
+
+def _report(label: str, pages: int, seconds: float, chunks: int) -> None:
+    print(f"{label:<24} {seconds:8.2f}s  {pages / seconds:8.1f} pages/s  {chunks} chunks")
+
+
+async def _run_pool(file_path: str, pages: int, workers: int, baseline_chunks: list) -> None:
+    settings.parse_workers = workers
+    parse_pool.shutdown_pool()
+    # Warm the pool so process start-up is not counted
+    await parse_pool.parse_and_chunk_async(file_path, "pdf")
+
+    start = time.perf_counter()
+    chunks = await parse_pool.parse_and_chunk_async(file_path, "pdf")
+    elapsed = time.perf_counter() - start
+    assert chunks == baseline_chunks, "process pool output differs from single-threaded output"
+    _report(f"pool ({workers} workers)", pages, elapsed, len(chunks))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=600)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "contract.pdf")
+        write_synthetic_pdf(file_path, args.pages)
+
+        start = time.perf_counter()
+        baseline = parse_and_chunk(file_path, "pdf")
+        _report("single-threaded", args.pages, time.perf_counter() - start, len(baseline))
+
+        for workers in args.workers:
+            asyncio.run(_run_pool(file_path, args.pages, workers, baseline))
+        parse_pool.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Report recall@k, query latency and bytes per chunk for each vector quantization mode.
+
+For every mode the ANN index is rebuilt in that mode and vector_search is
+run for chunk embeddings sampled from the corpus in the database
+(DATABASE_URL). Exact search is the baseline. The configured index is
+restored at the end. Run from the backend directory:
+    python -m benchmarks.bench_quantization --queries 200 --k 8
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+
+from benchmarks.bench_ann_recall import _sample_queries
+from config import settings
+from database import async_session
+from services import vector_index
+from services.retrieval import vector_search
+
+MODES = ("none", "halfvec", "binary", "short")
+
+
+async def _exact(embedding, k: int) -> set:
+    async with async_session() as db:
+        result = await db.execute(
+            text("""
+                WITH scoped AS MATERIALIZED (
+                    SELECT dc.id, dc.embedding <=> :embedding AS distance
+                    FROM document_chunks dc
+                    JOIN documents d ON d.id = dc.document_id
+                    WHERE dc.embedding IS NOT NULL AND d.status = 'ready'
+                )
+                SELECT id FROM scoped ORDER BY distance LIMIT :k
+            """),
+            {"embedding": embedding, "k": k},
+        )
+        return {str(row[0]) for row in result}
+
+
+async def _bytes_per_chunk() -> tuple[float, float]:
+    async with async_session() as db:
+        row = (await db.execute(text("""
+            SELECT greatest(count(*), 1) AS n,
+                   pg_table_size('document_chunks') AS table_bytes,
+                   coalesce(pg_relation_size(to_regclass(:index)), 0) AS index_bytes
+            FROM document_chunks
+        """), {"index": vector_index.INDEX_NAME})).mappings().one()
+    return row["table_bytes"] / row["n"], row["index_bytes"] / row["n"]
+
+
+async def main(queries: int, k: int) -> None:
+    samples = await _sample_queries(queries)
+    truth = [await _exact(embedding, k) for embedding in samples]
+    configured = settings.vector_quantization
+
+    print(f"{'mode':<8} {'recall@' + str(k):>9} {'p50 ms':>8} {'p95 ms':>8} {'table B/chunk':>14} {'index B/chunk':>14}")
+    try:
+        for mode in MODES:
+            settings.vector_quantization = mode
+            await vector_index._build(settings.vector_index_type)
+            recalls, latencies = [], []
+            for embedding, expected in zip(samples, truth):
+                async with async_session() as db:
+                    start = time.perf_counter()
+                    results = await vector_search(embedding, db, limit=k)
+                    latencies.append(time.perf_counter() - start)
+                found = {r["chunk_id"] for r in results}
+                recalls.append(len(found & expected) / len(expected) if expected else 1.0)
+            latencies.sort()
+            table_bytes, index_bytes = await _bytes_per_chunk()
+            print(
+                f"{mode:<8} {statistics.mean(recalls):9.3f} {statistics.median(latencies) * 1000:8.2f} "
+                f"{latencies[int(len(latencies) * 0.95) - 1] * 1000:8.2f} {table_bytes:14.0f} {index_bytes:14.0f}"
+            )
+    finally:
+        settings.vector_quantization = configured
+        await vector_index._build(settings.vector_index_type)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.queries, args.k))
@@ -0,0 +1,65 @@
+"""Compare query embedding with and without cross-request micro-batching.
+
+The OpenAI API is simulated: each request takes a fixed latency and at most
+`embedding_concurrency` requests run at once, as in production. Queries
+arrive in bursts of --concurrency. Run from the backend directory:
+    python -m benchmarks.bench_query_batching --queries 400 --concurrency 1 8 64
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from config import settings
+from services import embedding
+
+
+async def _run(queries: int, concurrency: int, window_ms: float) -> tuple[float, list[float], int]:
+    settings.query_embedding_batch_window_ms = window_ms
+    embedding._batcher = None
+    embedding._query_cache = None
+    calls = 0
+
+    async def fake_api(texts):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(args.api_latency_ms / 1000)
+        return [[0.0] * 8 for _ in texts]
+
+    embedding._embed_uncached = fake_api
+    latencies: list[float] = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def query(i: int) -> None:
+        async with slots:
+            start = time.perf_counter()
+            await embedding.generate_embedding(f"query {i}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[query(i) for i in range(queries)])
+    return time.perf_counter() - start, latencies, calls
+
+
+async def main() -> None:
+    print(f"{'concurrency':>11} {'mode':<9} {'queries/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'API calls':>10}")
+    for concurrency in args.concurrency:
+        for label, window in (("single", 0), ("batched", args.window_ms)):
+            elapsed, latencies, calls = await _run(args.queries, concurrency, window)
+            latencies.sort()
+            print(
+                f"{concurrency:>11} {label:<9} {args.queries / elapsed:10.1f} "
+                f"{statistics.median(latencies) * 1000:8.1f} {latencies[int(len(latencies) * 0.95) - 1] * 1000:8.1f} "
+                f"{calls:10d}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--api-latency-ms", type=float, default=150)
+    args = parser.parse_args()
+    asyncio.run(main())
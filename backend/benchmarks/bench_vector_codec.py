@@ -0,0 +1,62 @@
+"""Compare the client-side cost of sending vectors as text vs. pgvector's binary format.
+
+Measures the Python serialization work per query vector and per 1,000-row
+insert, and the bytes each puts on the wire. No database is needed. Run
+from the backend directory:
+    python -m benchmarks.bench_vector_codec --repeat 200
+"""
+
+import argparse
+import time
+
+import numpy as np
+from pgvector.utils import Vector
+
+from config import settings
+
+
+def _text(vector: list[float]) -> str:
+    # What vector_search used to send
+    return "[" + ",".join(str(x) for x in vector) + "]"
+
+
+def _binary(vector: list[float]) -> bytes:
+    return Vector._to_db_binary(np.asarray(vector, dtype=np.float32))
+
+
+def _per_call(fn, items, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rows = [rng.standard_normal(settings.embedding_dimensions).tolist() for _ in range(args.rows)]
+    query = rows[0]
+
+    for label, fn in (("text", _text), ("binary", _binary)):
+        per_query = _per_call(fn, [query], args.repeat)
+        per_insert = _per_call(fn, rows, max(1, args.repeat // 50))
+        decode = _per_call(
+            Vector.from_text if label == "text" else Vector.from_binary,
+            [fn(query)],
+            args.repeat,
+        )
+        print(
+            f"{label:<7} encode {per_query * 1e6:8.1f}us/query  {per_insert * 1000:8.1f}ms/{args.rows} rows  "
+            f"decode {decode * 1e6:8.1f}us  {len(fn(query)):6d} bytes/vector"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Synthetic contract text and PDFs for the benchmarks."""
+
+import random
+
+import fitz  # PyMuPDF
+
+_CLAUSES = [
+    "The Receiving Party shall hold all Confidential Information in strict confidence and shall not disclose it to any third party without the prior written consent of the Disclosing Party.",
+    "Each party represents and warrants that it has full power and authority to enter into and perform its obligations under this Agreement.",
+    "This Agreement shall be governed by and construed in accordance with the laws of the State of Delaware, without regard to its conflict of laws principles.",
+    "Neither party shall be liable for any indirect, incidental, special or consequential damages arising out of or relating to this Agreement.",
+    "The Supplier shall indemnify, defend and hold harmless the Customer from and against any and all losses, claims, damages and expenses arising from a breach of this Agreement.",
+    "Either party may terminate this Agreement upon thirty (30) days' written notice if the other party materially breaches any provision and fails to cure such breach.",
+    "Any dispute arising under this Agreement shall be finally settled by binding arbitration administered in accordance with its commercial arbitration rules.",
+]
+
+
+def synthetic_page(page_number: int, rng: random.Random) -> str:
+    section = f"Section {page_number}.1 Obligations of the Parties"
+    paragraphs = [section]
+    for _ in range(6):
+        paragraphs.append(" ".join(rng.choice(_CLAUSES) for _ in range(3)))
+    return "\n\n".join(paragraphs)
+
+
+def synthetic_pages(page_count: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    return [{"text": synthetic_page(n, rng), "page_number": n} for n in range(1, page_count + 1)]
+
+
+def write_synthetic_pdf(path: str, page_count: int, seed: int = 0) -> None:
+    pdf = fitz.open()
+    for page in synthetic_pages(page_count, seed):
+        pdf_page = pdf.new_page(width=612, height=792)
+        pdf_page.insert_textbox(fitz.Rect(54, 54, 558, 738), page["text"], fontsize=9, fontname="helv")
+    pdf.save(path)
+    pdf.close()
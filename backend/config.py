@@ -9,14 +9,63 @@ class Settings(BaseSettings):
     upload_dir: str = "/var/data/uploads"
     frontend_url: str = "http://localhost:3000"
     max_upload_size_mb: int = 50
+    bulk_max_files: int = 2000
 
     # Embedding config
     embedding_model: str = "text-embedding-3-small"
     embedding_dimensions: int = 1536
+    embedding_short_dimensions: int = 256  # renormalized prefix stored for two-stage search
+    embedding_max_batch_tokens: int = 250_000  # OpenAI allows 300k tokens per request
+    embedding_max_batch_inputs: int = 2048
+    embedding_concurrency: int = 4
+    embedding_max_retries: int = 5
+    embedding_retry_base_delay: float = 0.5
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_age_days: int = 180
+    embedding_cache_max_entries: int = 2_000_000
+    query_embedding_cache_max_mb: int = 64
+    query_embedding_cache_ttl_seconds: int = 24 * 3600
+    query_embedding_batch_window_ms: float = 5  # 0 sends every query on its own
+    query_embedding_batch_max_size: int = 64
 
     # Chunking config
     chunk_target_tokens: int = 512
     chunk_overlap_tokens: int = 50
+    context_max_tokens: int = 3000  # Budget for retrieved excerpts in the chat prompt
+    history_max_tokens: int = 6000  # Budget for recent messages; older ones are summarized
+    summary_max_tokens: int = 1024
+    summary_model: str = "claude-3-5-haiku-20241022"
+
+    # Ingestion config
+    ingestion_workers: int = 2
+    parse_workers: int = 4
+    parse_pages_per_task: int = 25
+    chunk_write_batch_size: int = 500
+    ingestion_heartbeat_seconds: int = 30  # Jobs whose process misses three heartbeats are taken over
+
+    # Vector index config
+    vector_backend: str = "pgvector"  # pgvector, or numpy for an in-process index (single node, single worker)
+    numpy_index_dir: str = "/var/data/vector_index"
+    vector_index_type: str = "hnsw"  # hnsw, ivfflat or none
+    vector_index_hnsw_m: int = 16
+    vector_index_hnsw_ef_construction: int = 64
+    vector_index_ivfflat_lists: int = 0  # 0 sizes lists from the row count at build time
+    vector_index_maintenance_work_mem: str = "1GB"
+    vector_index_build_workers: int = 2
+    # What the ANN index stores for the first pass: none (full vectors), halfvec,
+    # binary, or short (the embedding_short prefix column)
+    vector_quantization: str = "none"
+    vector_rescore_factor: int = 4  # quantized search rescores this many candidates per result
+    vector_search_profile: str = "balanced"  # fast, balanced or accurate
+    vector_iterative_scan: bool = True  # only applied when the installed pgvector is >= 0.8
+    exact_search_max_chunks: int = 20_000  # document filters covering fewer chunks skip the ANN index
+
+    # Retrieval config
+    # sql: one fused query; concurrent: embedding overlaps keyword search; separate: sequential queries
+    hybrid_search_mode: str = "sql"
+    retrieval_cache_enabled: bool = True
+    retrieval_cache_max_mb: int = 32
+    retrieval_cache_ttl_seconds: int = 3600
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
@@ -1,21 +1,104 @@
+import logging
+
+import numpy as np
+from pgvector.asyncpg import register_vector
+from pgvector.sqlalchemy import VECTOR
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import text
+from sqlalchemy import event, text
 
 from config import settings
 
+logger = logging.getLogger(__name__)
+
 engine = create_async_engine(settings.database_url, echo=False)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+@event.listens_for(engine.sync_engine, "connect")
+def _register_vector_codec(dbapi_connection, connection_record):
+    # Vectors go over the wire as packed float32, both ways, on every connection
+    try:
+        dbapi_connection.run_async(register_vector)
+    except ValueError:
+        # The extension doesn't exist yet; init_db recycles this connection
+        logger.info("vector type not found, connection opened without the binary codec")
+
+
+class BinaryVector(VECTOR):
+    """pgvector column type whose binds are float32 arrays for the binary codec.
+
+    pgvector's own type formats binds as '[...]' text, which the binary
+    codec can't encode. Results already arrive as numpy arrays.
+    """
+
+    cache_ok = True
+
+    def bind_processor(self, dialect):
+        def process(value):
+            if value is None:
+                return None
+            value = np.asarray(value, dtype=np.float32)
+            if self.dim is not None and value.shape != (self.dim,):
+                raise ValueError(f"expected {self.dim} dimensions, not {value.shape[-1]}")
+            return value
+        return process
+
+
 class Base(DeclarativeBase):
     pass
 
 
+# create_all only creates missing tables, so columns added to existing tables
+# are applied here. Every statement must be idempotent.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS status VARCHAR(20) NOT NULL DEFAULT 'ready'",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)",
+    "ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS batch_id UUID",
+    "CREATE INDEX IF NOT EXISTS ix_ingestion_jobs_batch_id ON ingestion_jobs (batch_id)",
+    # Existing jobs keep a NULL heartbeat, so the first worker to start claims them
+    "ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ",
+    "ALTER TABLE ingestion_jobs ALTER COLUMN heartbeat_at SET DEFAULT now()",
+    # Adding a stored generated column backfills every existing row
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', content)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_document_chunks_content_tsv ON document_chunks USING gin (content_tsv)",
+    "CREATE INDEX IF NOT EXISTS ix_document_chunks_document_id ON document_chunks (document_id)",
+    # Added, and backfilled for documents ingested before it existed, only once
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'documents' AND column_name = 'chunk_count'
+        ) THEN
+            ALTER TABLE documents ADD COLUMN chunk_count INTEGER NOT NULL DEFAULT 0;
+            UPDATE documents d SET chunk_count = c.n FROM (
+                SELECT document_id, count(*) AS n FROM document_chunks GROUP BY document_id
+            ) c WHERE c.document_id = d.id;
+        END IF;
+    END $$
+    """,
+    f"ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_short vector({settings.embedding_short_dimensions})",
+    # Rows still waiting for the embedding_short backfill, which short-mode search scores exactly
+    "CREATE INDEX IF NOT EXISTS ix_document_chunks_embedding_short_missing ON document_chunks (id) "
+    "WHERE embedding_short IS NULL AND embedding IS NOT NULL",
+    "INSERT INTO corpus_state (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING",
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary TEXT",
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary_message_count INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS token_count INTEGER",
+]
+
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         await conn.run_sync(Base.metadata.create_all)
+        for statement in SCHEMA_UPGRADES:
+            await conn.execute(text(statement))
+    # Connections opened before the extension existed lack the vector codec
+    await engine.dispose()
 
 
 async def get_db():
@@ -6,14 +6,24 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from config import settings
 from database import init_db
-from routers import chat, conversations, documents
+from routers import admin, chat, conversations, documents
+from services import embedding_cache, ingestion, numpy_index, parse_pool, vector_index
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     os.makedirs(settings.upload_dir, exist_ok=True)
     await init_db()
+    await vector_index.detect_extension()
+    await embedding_cache.evict()
+    if numpy_index.enabled():
+        await numpy_index.load()
+    else:
+        await vector_index.ensure_index()
+    await ingestion.start_workers()
     yield
+    await ingestion.stop_workers()
+    parse_pool.shutdown_pool()
 
 
 app = FastAPI(
@@ -34,6 +44,7 @@ app.add_middleware(
 app.include_router(documents.router)
 app.include_router(conversations.router)
 app.include_router(chat.router)
+app.include_router(admin.router)
 
 
 @app.get("/api/health")
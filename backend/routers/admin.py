@@ -0,0 +1,63 @@
+from fastapi import APIRouter, HTTPException, status
+from pydantic import BaseModel
+
+from config import settings
+from services import embedding, embedding_cache, metrics, numpy_index, retrieval, vector_index
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+@router.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
+
+@router.get("/embedding-cache")
+async def get_embedding_cache_stats():
+    return await embedding_cache.stats()
+
+
+@router.post("/embedding-cache/evict")
+async def evict_embedding_cache():
+    return {"evicted": await embedding_cache.evict()}
+
+
+@router.get("/query-embedding-cache")
+async def get_query_embedding_cache_stats():
+    return embedding.get_query_cache().stats()
+
+
+@router.get("/retrieval-cache")
+async def get_retrieval_cache_stats():
+    return retrieval.retrieval_cache_stats()
+
+
+class VectorIndexRebuildRequest(BaseModel):
+    index_type: str | None = None  # hnsw, ivfflat or none; defaults to the configured type
+    m: int | None = None
+    ef_construction: int | None = None
+    lists: int | None = None
+
+
+@router.get("/vector-index")
+async def get_vector_index_status():
+    if numpy_index.enabled():
+        return {"backend": "numpy", **numpy_index.get_index().stats()}
+    return {"backend": "pgvector", **await vector_index.index_status()}
+
+
+@router.post("/vector-index/rebuild", status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_vector_index(request: VectorIndexRebuildRequest):
+    index_type = request.index_type or settings.vector_index_type
+    try:
+        vector_index.start_rebuild(
+            None if index_type == "none" else index_type,
+            m=request.m,
+            ef_construction=request.ef_construction,
+            lists=request.lists,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "building", "index_type": index_type}
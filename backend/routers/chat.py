@@ -1,17 +1,22 @@
 import json
+import uuid
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from config import settings
 from database import get_db
 from models import Conversation, Message
 from services.citation import build_citations, format_context_for_llm
+from services.context_packer import pack_context
+from services.conversation_history import recent_messages, schedule_summary
 from services.llm import stream_chat_with_context
 from services.retrieval import hybrid_search
+from utils import count_tokens
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
@@ -19,7 +24,7 @@ router = APIRouter(prefix="/api/chat", tags=["chat"])
 class ChatRequest(BaseModel):
     conversation_id: str
     message: str
-    document_ids: list[str] | None = None  # Filter to specific documents
+    document_ids: list[uuid.UUID] | None = None  # Filter to specific documents
 
 
 @router.post("")
@@ -39,6 +44,7 @@ async def chat(req: ChatRequest, db: AsyncSession = Depends(get_db)):
         conversation_id=conversation.id,
         role="user",
         content=req.message,
+        token_count=count_tokens(req.message),
     )
     db.add(user_msg)
     await db.flush()
@@ -46,15 +52,20 @@ async def chat(req: ChatRequest, db: AsyncSession = Depends(get_db)):
     # Retrieve relevant chunks
     retrieved = await hybrid_search(req.message, db, limit=8, document_ids=req.document_ids)
 
-    # Build citations and context
-    citations = build_citations(retrieved)
+    # Merge neighbouring chunks and fit the excerpts to the token budget,
+    # then number what is actually sent
+    citations = build_citations(pack_context(retrieved))
     context = format_context_for_llm(citations)
 
-    # Build conversation history for LLM
+    # Build conversation history for LLM: the summary of older turns plus
+    # the recent messages that fit the history budget
     history = [
         {"role": msg.role, "content": msg.content}
-        for msg in conversation.messages
+        for msg in recent_messages(
+            conversation.messages, conversation.summary_message_count, settings.history_max_tokens
+        )
     ]
+    summary = conversation.summary
 
     # Stream response via SSE
     has_documents = len(citations) > 0
@@ -62,7 +73,9 @@ async def chat(req: ChatRequest, db: AsyncSession = Depends(get_db)):
 
     async def event_stream():
         full_response = ""
-        async for chunk in stream_chat_with_context(req.message, context, history, has_documents=has_documents):
+        async for chunk in stream_chat_with_context(
+            req.message, context, history, has_documents=has_documents, summary=summary
+        ):
             full_response += chunk
             yield f"data: {json.dumps({'type': 'token', 'content': chunk})}\n\n"
 
@@ -75,9 +88,14 @@ async def chat(req: ChatRequest, db: AsyncSession = Depends(get_db)):
             role="assistant",
             content=full_response,
             citations=citations_json,
+            token_count=count_tokens(full_response),
+            # now() is the transaction start, the same as the user message's;
+            # the wall clock keeps the reply ordered after it
+            created_at=func.clock_timestamp(),
         )
         db.add(assistant_msg)
         await db.commit()
+        schedule_summary(conversation.id)
 
         yield f"data: {json.dumps({'type': 'done'})}\n\n"
 
@@ -1,24 +1,33 @@
+import asyncio
 import logging
 import os
 import uuid
+import zipfile
+from collections.abc import AsyncIterator
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, status
 from fastapi.responses import FileResponse
 
 logger = logging.getLogger(__name__)
 from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.formparsers import MultiPartException
 
 from config import settings
 from database import get_db
-from models import Document, DocumentChunk
-from services.document_processor import parse_and_chunk
-from services.embedding import generate_embeddings
+from models import Document, IngestionJob
+from services import corpus, numpy_index
+from services.ingestion import (
+    IngestionError, activate_committed_rows, copy_chunks, enqueue, find_duplicate, run_job,
+)
+from services.storage import UnreadableMemberError, UploadTooLargeError, iter_upload, iter_zip_members, save_stream
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
 ALLOWED_TYPES = {"application/pdf": "pdf", "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx"}
+ZIP_TYPES = {"application/zip", "application/x-zip-compressed"}
 
 
 class DocumentResponse(BaseModel):
@@ -28,125 +37,312 @@ class DocumentResponse(BaseModel):
     file_size: int
     page_count: int | None
     chunk_count: int
+    status: str
     created_at: str
 
     model_config = {"from_attributes": True}
 
 
-@router.post("", response_model=DocumentResponse)
-async def upload_document(file: UploadFile, db: AsyncSession = Depends(get_db)):
-    # Validate file type
-    content_type = file.content_type or ""
-    file_type = ALLOWED_TYPES.get(content_type)
+class IngestionJobResponse(BaseModel):
+    id: str
+    document_id: str
+    status: str
+    stage: str | None
+    pages_parsed: int
+    chunks_total: int
+    chunks_embedded: int
+    rows_written: int
+    error: str | None
+    document: DocumentResponse
+
+
+def _document_response(doc: Document, chunk_count: int) -> DocumentResponse:
+    return DocumentResponse(
+        id=str(doc.id),
+        filename=doc.filename,
+        file_type=doc.file_type,
+        file_size=doc.file_size,
+        page_count=doc.page_count,
+        chunk_count=chunk_count,
+        status=doc.status,
+        created_at=doc.created_at.isoformat(),
+    )
+
+
+def _job_response(job: IngestionJob, doc: Document) -> IngestionJobResponse:
+    return IngestionJobResponse(
+        id=str(job.id),
+        document_id=str(job.document_id),
+        status=job.status,
+        stage=job.stage,
+        pages_parsed=job.pages_parsed,
+        chunks_total=job.chunks_total,
+        chunks_embedded=job.chunks_embedded,
+        rows_written=job.rows_written,
+        error=job.error,
+        document=_document_response(doc, job.rows_written),
+    )
+
+
+def _detect_file_type(filename: str | None, content_type: str | None) -> str | None:
+    file_type = ALLOWED_TYPES.get(content_type or "")
     if not file_type:
         # Fallback: check extension
-        ext = os.path.splitext(file.filename or "")[1].lower()
+        ext = os.path.splitext(filename or "")[1].lower()
         if ext == ".pdf":
             file_type = "pdf"
         elif ext == ".docx":
             file_type = "docx"
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed: PDF, DOCX")
-
-    # Save file
-    os.makedirs(settings.upload_dir, exist_ok=True)
-    file_id = uuid.uuid4()
-    file_ext = "pdf" if file_type == "pdf" else "docx"
-    file_path = os.path.join(settings.upload_dir, f"{file_id}.{file_ext}")
-
-    content = await file.read()
-    if len(content) > settings.max_upload_size_mb * 1024 * 1024:
-        raise HTTPException(status_code=400, detail=f"File too large. Max: {settings.max_upload_size_mb}MB")
+    return file_type
 
-    with open(file_path, "wb") as f:
-        f.write(content)
 
-    # Parse and chunk
-    try:
-        chunks = parse_and_chunk(file_path, file_type)
-    except Exception as e:
-        os.remove(file_path)
-        raise HTTPException(status_code=422, detail=f"Failed to parse document: {e}")
-
-    if not chunks:
-        os.remove(file_path)
-        raise HTTPException(status_code=422, detail="No text content found in document")
-
-    # Generate embeddings in batches
-    try:
-        batch_size = 100
-        all_embeddings: list[list[float]] = []
-        for i in range(0, len(chunks), batch_size):
-            batch_texts = [c.content for c in chunks[i : i + batch_size]]
-            batch_embeddings = await generate_embeddings(batch_texts)
-            all_embeddings.extend(batch_embeddings)
-    except Exception as e:
-        os.remove(file_path)
-        logger.exception("Embedding generation failed")
-        raise HTTPException(status_code=502, detail=f"Embedding generation failed: {e}")
+async def _store_document(
+    db: AsyncSession,
+    filename: str,
+    file_type: str,
+    chunks: AsyncIterator[bytes],
+    batch_id: uuid.UUID | None = None,
+) -> tuple[Document, IngestionJob]:
+    """Save a file and add its Document and IngestionJob to the session.
 
-    # Compute page count
-    page_numbers = [c.page_number for c in chunks if c.page_number is not None]
-    page_count = max(page_numbers) if page_numbers else None
+    An identical, already-ingested file has its chunks copied and the job is
+    returned completed; otherwise the job is left queued for the workers.
+    """
+    os.makedirs(settings.upload_dir, exist_ok=True)
+    file_id = uuid.uuid4()
+    file_path = os.path.join(settings.upload_dir, f"{file_id}.{file_type}")
+    stored = await save_stream(chunks, file_path, settings.max_upload_size_mb * 1024 * 1024)
 
-    # Store document
     doc = Document(
         id=file_id,
-        filename=file.filename or "unknown",
+        filename=filename,
         file_type=file_type,
         file_path=file_path,
-        file_size=len(content),
-        page_count=page_count,
+        file_size=stored.size,
+        content_hash=stored.sha256,
+        status="processing",
     )
+    job = IngestionJob(document_id=file_id, batch_id=batch_id)
     db.add(doc)
+    db.add(job)
 
-    # Store chunks with embeddings
-    for idx, (chunk, embedding) in enumerate(zip(chunks, all_embeddings)):
-        db_chunk = DocumentChunk(
-            document_id=file_id,
-            chunk_index=idx,
-            content=chunk.content,
-            page_number=chunk.page_number,
-            section=chunk.section,
-            token_count=chunk.token_count,
-            embedding=embedding,
-        )
-        db.add(db_chunk)
+    try:
+        # Identical file already ingested: reuse its chunks and embeddings
+        duplicate = await find_duplicate(db, stored.sha256)
+        await db.flush()
+        if duplicate:
+            rows = await copy_chunks(db, duplicate.id, file_id)
+            doc.page_count = duplicate.page_count
+            doc.chunk_count = rows
+            doc.status = "ready"
+            await corpus.bump_version(db)
+            job.status = "completed"
+            job.chunks_total = job.chunks_embedded = job.rows_written = rows
+    except BaseException:
+        # The rows will never be committed, so don't leave the file behind
+        os.remove(file_path)
+        raise
+    return doc, job
+
+
+@router.post("", response_model=IngestionJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def upload_document(file: UploadFile, db: AsyncSession = Depends(get_db)):
+    file_type = _detect_file_type(file.filename, file.content_type)
+    if not file_type:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed: PDF, DOCX")
+
+    try:
+        doc, job = await _store_document(db, file.filename or "unknown", file_type, iter_upload(file))
+    except UploadTooLargeError:
+        raise HTTPException(status_code=400, detail=f"File too large. Max: {settings.max_upload_size_mb}MB")
 
     await db.commit()
+    activate_committed_rows(db)
     await db.refresh(doc)
+    # Parsing, embedding and storage run on the ingestion workers
+    if job.status == "queued":
+        await enqueue([job.id])
 
-    return DocumentResponse(
-        id=str(doc.id),
-        filename=doc.filename,
-        file_type=doc.file_type,
-        file_size=doc.file_size,
-        page_count=doc.page_count,
-        chunk_count=len(chunks),
-        created_at=doc.created_at.isoformat(),
+    return _job_response(job, doc)
+
+
+class BulkFileResult(BaseModel):
+    filename: str
+    status: str  # queued, duplicate, rejected
+    job_id: str | None = None
+    document_id: str | None = None
+    error: str | None = None
+
+
+class BulkUploadResponse(BaseModel):
+    batch_id: str
+    accepted: int
+    rejected: int
+    files: list[BulkFileResult]
+
+
+# The form is parsed in the endpoint so Starlette's default limit of 1000
+# files does not cap bulk_max_files; this documents the request body
+BULK_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+            "required": ["files"],
+        }}},
+    },
+}
+
+
+@router.post(
+    "/bulk",
+    response_model=BulkUploadResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    openapi_extra=BULK_UPLOAD_BODY,
+)
+async def bulk_upload_documents(request: Request, db: AsyncSession = Depends(get_db)):
+    """Ingest many files, or ZIP archives of them, as one batch.
+
+    All accepted documents are ingested together so their chunks share full
+    embedding batches. Each file is reported as queued, duplicate or rejected.
+    """
+    try:
+        form = await request.form(max_files=settings.bulk_max_files, max_fields=settings.bulk_max_files)
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    try:
+        files = [f for f in form.getlist("files") if isinstance(f, StarletteUploadFile)]
+        if not files:
+            raise HTTPException(status_code=422, detail="No files uploaded")
+        return await _ingest_bulk(db, files)
+    finally:
+        await form.close()
+
+
+async def _ingest_bulk(db: AsyncSession, files: list[StarletteUploadFile]) -> BulkUploadResponse:
+    batch_id = uuid.uuid4()
+    results: list[BulkFileResult] = []
+    queued: list[uuid.UUID] = []
+    stored_paths: list[str] = []
+
+    async def accept(filename: str, content_type: str | None, chunks: AsyncIterator[bytes]) -> None:
+        if len(results) >= settings.bulk_max_files:
+            results.append(BulkFileResult(filename=filename, status="rejected", error=f"Batch limit of {settings.bulk_max_files} files reached"))
+            return
+        file_type = _detect_file_type(filename, content_type)
+        if not file_type:
+            results.append(BulkFileResult(filename=filename, status="rejected", error="Unsupported file type. Allowed: PDF, DOCX"))
+            return
+        try:
+            doc, job = await _store_document(db, filename, file_type, chunks, batch_id)
+        except UploadTooLargeError:
+            results.append(BulkFileResult(filename=filename, status="rejected", error=f"File too large. Max: {settings.max_upload_size_mb}MB"))
+            return
+        except UnreadableMemberError as e:
+            results.append(BulkFileResult(filename=filename, status="rejected", error=f"Cannot extract from ZIP: {e}"))
+            return
+        stored_paths.append(doc.file_path)
+        if job.status == "queued":
+            queued.append(job.id)
+        results.append(BulkFileResult(
+            filename=filename,
+            status="queued" if job.status == "queued" else "duplicate",
+            job_id=str(job.id),
+            document_id=str(doc.id),
+        ))
+
+    try:
+        for file in files:
+            filename = file.filename or "unknown"
+            if filename.lower().endswith(".zip") or file.content_type in ZIP_TYPES:
+                try:
+                    async for member_name, chunks in iter_zip_members(file):
+                        await accept(member_name, None, chunks)
+                except zipfile.BadZipFile:
+                    results.append(BulkFileResult(filename=filename, status="rejected", error="Invalid ZIP archive"))
+            else:
+                await accept(filename, file.content_type, iter_upload(file))
+        await db.commit()
+    except BaseException:
+        # Nothing was committed, so the files saved so far belong to no document
+        for path in stored_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    activate_committed_rows(db)
+    if queued:
+        await enqueue(queued)
+
+    rejected = sum(1 for r in results if r.status == "rejected")
+    return BulkUploadResponse(batch_id=str(batch_id), accepted=len(results) - rejected, rejected=rejected, files=results)
+
+
+class BatchStatusResponse(BaseModel):
+    batch_id: str
+    total: int
+    queued: int
+    running: int
+    completed: int
+    failed: int
+    documents_per_minute: float | None
+    jobs: list[IngestionJobResponse]
+
+
+@router.get("/batches/{batch_id}", response_model=BatchStatusResponse)
+async def get_ingestion_batch(batch_id: str, db: AsyncSession = Depends(get_db)):
+    """Report progress and throughput of a bulk upload."""
+    result = await db.execute(
+        select(IngestionJob, Document)
+        .join(Document, Document.id == IngestionJob.document_id)
+        .where(IngestionJob.batch_id == batch_id)
+        .order_by(IngestionJob.created_at)
+    )
+    rows = result.all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Ingestion batch not found")
+
+    counts = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+    for job, _ in rows:
+        counts[job.status] += 1
+
+    # Throughput over the whole data room: finished documents per minute since the batch was accepted
+    finished = [job for job, _ in rows if job.status in ("completed", "failed")]
+    documents_per_minute = None
+    if counts["completed"]:
+        started = min(job.created_at for job, _ in rows)
+        elapsed = (max(job.updated_at for job in finished) - started).total_seconds()
+        documents_per_minute = counts["completed"] / max(elapsed / 60, 1 / 60)
+
+    return BatchStatusResponse(
+        batch_id=batch_id,
+        total=len(rows),
+        documents_per_minute=documents_per_minute,
+        jobs=[_job_response(job, doc) for job, doc in rows],
+        **counts,
     )
 
 
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_ingestion_job(job_id: str, db: AsyncSession = Depends(get_db)):
+    """Report per-stage progress of a background ingestion job."""
+    result = await db.execute(
+        select(IngestionJob, Document)
+        .join(Document, Document.id == IngestionJob.document_id)
+        .where(IngestionJob.id == job_id)
+    )
+    row = result.one_or_none()
+    if not row:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    job, doc = row
+    return _job_response(job, doc)
+
+
 @router.get("", response_model=list[DocumentResponse])
 async def list_documents(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Document).order_by(Document.created_at.desc()))
     docs = result.scalars().all()
-    responses = []
-    for doc in docs:
-        chunk_result = await db.execute(
-            select(DocumentChunk.id).where(DocumentChunk.document_id == doc.id)
-        )
-        chunk_count = len(chunk_result.all())
-        responses.append(DocumentResponse(
-            id=str(doc.id),
-            filename=doc.filename,
-            file_type=doc.file_type,
-            file_size=doc.file_size,
-            page_count=doc.page_count,
-            chunk_count=chunk_count,
-            created_at=doc.created_at.isoformat(),
-        ))
-    return responses
+    return [_document_response(doc, doc.chunk_count) for doc in docs]
 
 
 class CreateFromTextRequest(BaseModel):
@@ -181,26 +377,6 @@ async def create_document_from_text(req: CreateFromTextRequest, db: AsyncSession
     file_size = os.path.getsize(file_path)
     pdf_doc.close()
 
-    # Parse and chunk the generated PDF
-    try:
-        chunks = parse_and_chunk(file_path, "pdf")
-    except Exception as e:
-        os.remove(file_path)
-        raise HTTPException(status_code=422, detail=f"Failed to process document: {e}")
-
-    if not chunks:
-        os.remove(file_path)
-        raise HTTPException(status_code=422, detail="No text content generated")
-
-    # Generate embeddings
-    try:
-        batch_texts = [c.content for c in chunks]
-        all_embeddings = await generate_embeddings(batch_texts)
-    except Exception as e:
-        os.remove(file_path)
-        logger.exception("Embedding generation failed")
-        raise HTTPException(status_code=502, detail=f"Embedding generation failed: {e}")
-
     # Ensure filename ends with .pdf
     filename = req.filename if req.filename.endswith(".pdf") else req.filename + ".pdf"
 
@@ -211,33 +387,27 @@ async def create_document_from_text(req: CreateFromTextRequest, db: AsyncSession
         file_path=file_path,
         file_size=file_size,
         page_count=page_num,
+        status="processing",
     )
+    job = IngestionJob(document_id=file_id)
     db.add(doc)
+    db.add(job)
+    await db.commit()
 
-    for idx, (chunk, embedding) in enumerate(zip(chunks, all_embeddings)):
-        db_chunk = DocumentChunk(
-            document_id=file_id,
-            chunk_index=idx,
-            content=chunk.content,
-            page_number=chunk.page_number,
-            section=chunk.section,
-            token_count=chunk.token_count,
-            embedding=embedding,
-        )
-        db.add(db_chunk)
+    # Drafts are small, so they are ingested inline rather than queued
+    try:
+        await run_job(job.id)
+    except IngestionError as e:
+        # The caller gets the error, not a document; don't leave a failed row behind.
+        # The failed job already removed the PDF and any chunks.
+        await db.delete(doc)
+        await db.commit()
+        status_code = {"embedding": 502, "storage": 500}.get(e.stage, 422)
+        raise HTTPException(status_code=status_code, detail=str(e))
 
-    await db.commit()
     await db.refresh(doc)
-
-    return DocumentResponse(
-        id=str(doc.id),
-        filename=doc.filename,
-        file_type=doc.file_type,
-        file_size=doc.file_size,
-        page_count=doc.page_count,
-        chunk_count=len(chunks),
-        created_at=doc.created_at.isoformat(),
-    )
+    await db.refresh(job)
+    return _document_response(doc, doc.chunk_count)
 
 
 @router.get("/{document_id}/file")
@@ -265,11 +435,18 @@ async def delete_document(document_id: str, db: AsyncSession = Depends(get_db)):
     doc = result.scalar_one_or_none()
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
+    if doc.status == "processing":
+        # Its job is queued or running in a worker, which would write into a deleted document
+        raise HTTPException(status_code=409, detail="Document is still being ingested; delete it once processing finishes")
 
     # Delete file
     if os.path.exists(doc.file_path):
         os.remove(doc.file_path)
 
     await db.delete(doc)
+    await corpus.bump_version(db)
     await db.commit()
+    if numpy_index.enabled():
+        # Scans every row's document id; keep it off the event loop
+        await asyncio.to_thread(numpy_index.get_index().remove_document, doc.id)
     return {"status": "deleted"}
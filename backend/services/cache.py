@@ -0,0 +1,75 @@
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from services import metrics
+
+
+class LRUCache:
+    """In-process LRU cache bounded in bytes, with a TTL.
+
+    `sizeof` estimates a value's memory footprint; sizes also count the key,
+    so `max_bytes` tracks real memory use far better than an entry count.
+    Hits and misses are reported to metrics under `name`.
+    """
+
+    def __init__(self, name: str, max_bytes: int, ttl_seconds: float, sizeof: Callable[[Any], int] = sys.getsizeof):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sizeof = sizeof
+        self.size_bytes = 0
+        self._entries: OrderedDict[Hashable, tuple[Any, float, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] < time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            metrics.incr(f"{self.name}.misses")
+            return None
+        self._entries.move_to_end(key)
+        metrics.incr(f"{self.name}.hits")
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self.sizeof(value) + sys.getsizeof(key)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds, size)
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            metrics.incr(f"{self.name}.evictions")
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self.size_bytes -= size
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_rate": metrics.hit_rate(self.name),
+        }
+
+
+class ArrayCache(LRUCache):
+    """LRU cache of numpy arrays, sized by their buffers."""
+
+    def __init__(self, name: str, max_bytes: int, ttl_seconds: float):
+        super().__init__(name, max_bytes, ttl_seconds, sizeof=lambda value: value.nbytes)
@@ -0,0 +1,55 @@
+import uuid
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from services.document_processor import TextChunk
+from services.embedding import shorten_embedding
+
+COLUMNS = [
+    "id", "document_id", "chunk_index", "content", "page_number", "section", "token_count",
+    "embedding", "embedding_short",
+]
+
+
+class ChunkWriter:
+    """Buffer chunk rows and stream them into document_chunks with binary COPY.
+
+    At most `batch_size` rows are held in memory; rows are written inside the
+    session's current transaction.
+    """
+
+    def __init__(self, db: AsyncSession, batch_size: int | None = None):
+        self.db = db
+        self.batch_size = batch_size or settings.chunk_write_batch_size
+        self.rows_written = 0
+        self._rows: list[tuple] = []
+
+    async def add(self, document_id: uuid.UUID, chunk_index: int, chunk: TextChunk, embedding: list[float]) -> uuid.UUID:
+        """Queue a row and return its chunk id."""
+        chunk_id = uuid.uuid4()
+        self._rows.append((
+            chunk_id,
+            document_id,
+            chunk_index,
+            chunk.content,
+            chunk.page_number,
+            chunk.section,
+            chunk.token_count,
+            np.asarray(embedding, dtype=np.float32),
+            shorten_embedding(embedding),
+        ))
+        if len(self._rows) >= self.batch_size:
+            await self.flush()
+        return chunk_id
+
+    async def flush(self) -> None:
+        if not self._rows:
+            return
+        # Every pooled connection has pgvector's binary codec (see database.py)
+        conn = await self.db.connection()
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table("document_chunks", records=self._rows, columns=COLUMNS)
+        self.rows_written += len(self._rows)
+        self._rows = []
@@ -10,6 +10,8 @@ class Citation:
     page_number: int | None
     section: str | None
     chunk_id: str
+    page_end: int | None = None
+    chunk_ids: list[str] | None = None  # every chunk merged into this excerpt, chunk_id first
 
     def to_dict(self) -> dict:
         return {
@@ -20,6 +22,8 @@ class Citation:
             "page_number": self.page_number,
             "section": self.section,
             "chunk_id": self.chunk_id,
+            "page_end": self.page_end,
+            "chunk_ids": self.chunk_ids or [self.chunk_id],
         }
 
     def format_for_llm(self) -> str:
@@ -27,7 +31,9 @@ class Citation:
         location = self.filename
         if self.section:
             location += f", {self.section}"
-        if self.page_number:
+        if self.page_number and self.page_end and self.page_end != self.page_number:
+            location += f", pages {self.page_number}-{self.page_end}"
+        elif self.page_number:
             location += f", page {self.page_number}"
         return f"[{self.number}] ({location}):\n{self.content}"
 
@@ -44,6 +50,8 @@ def build_citations(retrieved_chunks: list[dict]) -> list[Citation]:
             page_number=chunk.get("page_number"),
             section=chunk.get("section"),
             chunk_id=chunk["chunk_id"],
+            page_end=chunk.get("page_end"),
+            chunk_ids=chunk.get("chunk_ids"),
         ))
     return citations
 
@@ -0,0 +1,92 @@
+from config import settings
+from utils import count_tokens
+
+# Shortest suffix/prefix match treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+
+
+def _overlap_length(previous: str, following: str) -> int:
+    """Length of the longest suffix of `previous` that `following` starts with."""
+    window = min(len(previous), len(following))
+    start = len(previous) - window
+    first = following[:1]
+    while first:
+        i = previous.find(first, start)
+        if i < 0:
+            break
+        # The earliest match is the longest overlap
+        if following.startswith(previous[i:]):
+            length = len(previous) - i
+            return length if length >= MIN_OVERLAP_CHARS else 0
+        start = i + 1
+    return 0
+
+
+def _token_count(chunk: dict) -> int:
+    return chunk.get("token_count") or count_tokens(chunk["content"])
+
+
+def _merge(run: list[dict]) -> dict:
+    """Join consecutive chunks of one document, dropping the text each repeats from the last."""
+    merged = dict(run[0])
+    merged["token_count"] = _token_count(run[0])
+    for chunk in run[1:]:
+        overlap = _overlap_length(merged["content"], chunk["content"])
+        if overlap:
+            merged["content"] += chunk["content"][overlap:]
+            merged["token_count"] += max(_token_count(chunk) - settings.chunk_overlap_tokens, 0)
+        else:
+            merged["content"] += "\n\n" + chunk["content"]
+            merged["token_count"] += _token_count(chunk)
+    pages = [c["page_number"] for c in run if c.get("page_number")]
+    if pages:
+        merged["page_number"], merged["page_end"] = min(pages), max(pages)
+    # A run can cross section headings; name every section it covers, in order
+    sections = list(dict.fromkeys(c["section"] for c in run if c.get("section")))
+    merged["section"] = " / ".join(sections) or None
+    merged["chunk_ids"] = [c["chunk_id"] for c in run]
+    merged["score"] = max(c["score"] for c in run)
+    return merged
+
+
+def _runs(chunks: list[dict]) -> list[list[tuple[int, dict]]]:
+    """Group (rank, chunk) pairs into runs of consecutive chunk_index per document, best run first."""
+    by_document: dict[str, list[tuple[int, dict]]] = {}
+    for rank, chunk in enumerate(chunks):
+        by_document.setdefault(chunk["document_id"], []).append((rank, chunk))
+
+    runs = []
+    for ranked in by_document.values():
+        ranked.sort(key=lambda item: item[1]["chunk_index"])
+        current = [ranked[0]]
+        for item in ranked[1:]:
+            if item[1]["chunk_index"] == current[-1][1]["chunk_index"] + 1:
+                current.append(item)
+            else:
+                runs.append(current)
+                current = [item]
+        runs.append(current)
+    return sorted(runs, key=lambda run: min(rank for rank, _ in run))
+
+
+def pack_context(chunks: list[dict], max_tokens: int | None = None) -> list[dict]:
+    """Merge neighbouring chunks and keep the best of them within a token budget.
+
+    `chunks` are search results, best first. Runs of adjacent chunks from one
+    document become a single entry with the overlap removed, ranked by its
+    best member. Entries are added in rank order while they fit the budget;
+    a run that does not fit falls back to its best chunk alone. The top
+    result is always kept.
+    """
+    budget = max_tokens or settings.context_max_tokens
+    packed, used = [], 0
+    for run in _runs(chunks):
+        entry = _merge([chunk for _, chunk in run])
+        if packed and used + entry["token_count"] > budget:
+            _, best = min(run, key=lambda item: item[0])
+            entry = {**best, "token_count": _token_count(best), "chunk_ids": [best["chunk_id"]]}
+            if used + entry["token_count"] > budget:
+                continue
+        packed.append(entry)
+        used += entry["token_count"]
+    return packed
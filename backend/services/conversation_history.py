@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import uuid
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import selectinload
+
+from config import settings
+from database import async_session
+from models import Conversation, Message
+from services import llm, metrics
+from utils import count_tokens
+
+logger = logging.getLogger(__name__)
+
+_summarizing: set[uuid.UUID] = set()
+_tasks: set[asyncio.Task] = set()
+
+
+def message_tokens(message: Message) -> int:
+    # Messages saved before token_count existed are counted on the fly
+    return message.token_count if message.token_count is not None else count_tokens(message.content)
+
+
+def _next_turn(messages: list[Message], i: int) -> int:
+    """First index at or after i that starts a turn, so history never opens with a reply."""
+    while i < len(messages) and messages[i].role != "user":
+        i += 1
+    return i
+
+
+def recent_messages(messages: list[Message], start: int, max_tokens: int) -> list[Message]:
+    """The newest messages after the summarized `start` that fit in max_tokens.
+
+    Normally everything after `start` fits, because summarization keeps it
+    under budget; the cut only applies while a summary is still catching up.
+    """
+    first, used = len(messages), 0
+    for i in range(len(messages) - 1, start - 1, -1):
+        used += message_tokens(messages[i])
+        if used > max_tokens:
+            break
+        first = i
+    return messages[_next_turn(messages, first):]
+
+
+def fold_point(messages: list[Message], start: int, max_tokens: int) -> int:
+    """Where the summary should end: `start` while history fits max_tokens.
+
+    Otherwise whole turns are folded until about half the budget remains,
+    so the summary, and with it the cached prompt prefix, changes only once
+    every few turns.
+    """
+    remaining = sum(message_tokens(m) for m in messages[start:])
+    if remaining <= max_tokens:
+        return start
+    end = start
+    while end < len(messages) and remaining > max_tokens // 2:
+        remaining -= message_tokens(messages[end])
+        end += 1
+    # Back up to the start of the turn, unless that would fold nothing
+    turn = end
+    while start < turn < len(messages) and messages[turn].role != "user":
+        turn -= 1
+    return turn if turn > start else _next_turn(messages, end)
+
+
+async def update_summary(conversation_id: uuid.UUID) -> bool:
+    """Fold old messages into the conversation summary if history is over budget."""
+    async with async_session() as db:
+        conversation = (await db.execute(
+            select(Conversation)
+            .where(Conversation.id == conversation_id)
+            .options(selectinload(Conversation.messages))
+        )).scalar_one_or_none()
+    if conversation is None:
+        return False
+    start = conversation.summary_message_count
+    end = fold_point(conversation.messages, start, settings.history_max_tokens)
+    if end == start:
+        return False
+
+    with metrics.timed("conversation.summarize"):
+        summary = await llm.summarize_conversation(
+            conversation.summary,
+            [{"role": m.role, "content": m.content} for m in conversation.messages[start:end]],
+        )
+
+    async with async_session() as db:
+        # Skip if another worker already moved the summary on
+        result = await db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id, Conversation.summary_message_count == start)
+            .values(summary=summary, summary_message_count=end, updated_at=Conversation.updated_at)
+        )
+        await db.commit()
+    return result.rowcount == 1
+
+
+def schedule_summary(conversation_id: uuid.UUID) -> None:
+    """Update the summary in the background, one run per conversation at a time."""
+    if conversation_id in _summarizing:
+        return
+    _summarizing.add(conversation_id)
+
+    async def run():
+        try:
+            await update_summary(conversation_id)
+        except Exception:
+            logger.exception("Summarizing conversation %s failed", conversation_id)
+        finally:
+            _summarizing.discard(conversation_id)
+
+    task = asyncio.create_task(run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
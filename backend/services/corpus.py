@@ -0,0 +1,18 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# A scalar query, so callers can read the version alongside other values
+VERSION_SQL = "SELECT coalesce((SELECT version FROM corpus_state WHERE id = 1), 0)"
+
+
+async def bump_version(db: AsyncSession) -> None:
+    """Mark the searchable corpus as changed.
+
+    Call inside the transaction that makes documents ready or removes them,
+    so cached retrieval results are invalidated exactly when it commits.
+    """
+    await db.execute(text("UPDATE corpus_state SET version = version + 1 WHERE id = 1"))
+
+
+async def current_version(db: AsyncSession) -> int:
+    return await db.scalar(text(VERSION_SQL))
@@ -1,11 +1,15 @@
 import re
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
 
 import fitz  # PyMuPDF
 from docx import Document as DocxDocument
 
 from config import settings
-from utils import count_tokens
+from utils import decode, encode_batch
+
+# Paragraphs are tokenized in groups of this size: one encode_batch call each
+SEGMENT_BATCH_SIZE = 256
 
 
 @dataclass
@@ -18,29 +22,43 @@ class TextChunk:
 
 def parse_pdf(file_path: str) -> list[dict]:
     """Parse PDF and return list of {text, page_number} per page."""
-    doc = fitz.open(file_path)
-    pages = []
-    for page_num, page in enumerate(doc, start=1):
-        text = page.get_text()
-        if text.strip():
-            pages.append({"text": text, "page_number": page_num})
-    doc.close()
-    return pages
+    return list(iter_pdf_pages(file_path))
+
+
+def parse_pdf_range(file_path: str, start: int, end: int | None) -> list[dict]:
+    """Parse pages [start, end) of a PDF, keeping absolute 1-based page numbers."""
+    return list(iter_pdf_pages(file_path, start, end))
+
+
+def iter_pdf_pages(file_path: str, start: int = 0, end: int | None = None) -> Iterator[dict]:
+    """Yield {text, page_number} for each non-empty page, one page in memory at a time."""
+    with fitz.open(file_path) as doc:
+        for page_num in range(start, doc.page_count if end is None else min(end, doc.page_count)):
+            text = doc[page_num].get_text()
+            if text.strip():
+                yield {"text": text, "page_number": page_num + 1}
+
+
+def pdf_page_count(file_path: str) -> int:
+    with fitz.open(file_path) as doc:
+        return doc.page_count
 
 
 def parse_docx(file_path: str) -> list[dict]:
     """Parse DOCX and return list of {text, page_number} per paragraph group."""
+    return list(iter_docx_paragraphs(file_path))
+
+
+def iter_docx_paragraphs(file_path: str) -> Iterator[dict]:
     doc = DocxDocument(file_path)
-    paragraphs = []
     for para in doc.paragraphs:
         text = para.text.strip()
         if text:
-            paragraphs.append({
+            yield {
                 "text": text,
                 "page_number": None,
                 "style": para.style.name if para.style else None,
-            })
-    return paragraphs
+            }
 
 
 def _detect_section_header(text: str) -> str | None:
@@ -59,85 +77,155 @@ def _detect_section_header(text: str) -> str | None:
 
 def chunk_text(pages: list[dict], target_tokens: int | None = None, overlap_tokens: int | None = None) -> list[TextChunk]:
     """Chunk parsed document text into segments with overlap."""
-    target = target_tokens or settings.chunk_target_tokens
-    overlap = overlap_tokens or settings.chunk_overlap_tokens
+    return list(iter_chunks(iter_segments(pages), target_tokens, overlap_tokens))
 
-    # Combine all text with page markers
-    segments: list[dict] = []
+
+def split_segments(pages: list[dict]) -> list[dict]:
+    """Split pages into tokenized paragraphs, the unit chunks are built from."""
+    return list(iter_segments(pages))
+
+
+def iter_segments(pages: Iterable[dict]) -> Iterator[dict]:
+    """Lazily split pages into tokenized paragraphs.
+
+    Paragraphs are encoded SEGMENT_BATCH_SIZE at a time with encode_batch;
+    later stages only slice these token ids and never re-encode text.
+    """
+    pending: list[tuple[str, int | None]] = []
     for page in pages:
-        text = page["text"]
-        # Split into paragraphs
-        paragraphs = [p.strip() for p in re.split(r"\n\s*\n|\n(?=[A-Z\d])", text) if p.strip()]
-        for para in paragraphs:
-            segments.append({
-                "text": para,
-                "page_number": page.get("page_number"),
-                "tokens": count_tokens(para),
-            })
-
-    chunks: list[TextChunk] = []
-    current_text = ""
-    current_tokens = 0
-    current_page = segments[0]["page_number"] if segments else None
-    current_section = None
+        for para in re.split(r"\n\s*\n|\n(?=[A-Z\d])", page["text"]):
+            if para.strip():
+                pending.append((para.strip(), page.get("page_number")))
+        if len(pending) >= SEGMENT_BATCH_SIZE:
+            yield from _tokenize(pending)
+            pending = []
+    yield from _tokenize(pending)
+
+
+def _tokenize(paragraphs: list[tuple[str, int | None]]) -> list[dict]:
+    if not paragraphs:
+        return []
+    token_ids = encode_batch([text for text, _ in paragraphs])
+    return [
+        {"text": text, "page_number": page_number, "tokens": tokens}
+        for (text, page_number), tokens in zip(paragraphs, token_ids)
+    ]
+
+
+class ChunkBuilder:
+    """Incrementally pack segments into chunks of ~target tokens with exact-token overlap.
+
+    Feed segments in document order; each call returns the chunk it closed,
+    if any. A chunk's token_count is the sum of its parts' token counts; the
+    separators between paragraphs are not counted.
+    """
+
+    def __init__(self, target_tokens: int | None = None, overlap_tokens: int | None = None):
+        self.target = target_tokens or settings.chunk_target_tokens
+        self.overlap = overlap_tokens or settings.chunk_overlap_tokens
+        self.parts: list[tuple[str, list[int]]] = []  # (text, token ids) of the current chunk
+        self.tokens = 0
+        self.page: int | None = None
+        self.section: str | None = None
+
+    def feed(self, seg: dict) -> TextChunk | None:
+        closed = None
+        if self.page is None:
+            self.page = seg["page_number"]
 
-    for seg in segments:
         section = _detect_section_header(seg["text"])
         if section:
-            current_section = section
+            self.section = section
 
         # If adding this segment would exceed target, finalize current chunk
-        if current_tokens > 0 and current_tokens + seg["tokens"] > target:
-            chunks.append(TextChunk(
-                content=current_text.strip(),
-                page_number=current_page,
-                section=current_section,
-                token_count=current_tokens,
-            ))
-            # Overlap: keep last portion of current text
-            overlap_text = _get_overlap(current_text, overlap)
-            current_text = overlap_text + "\n\n" + seg["text"]
-            current_tokens = count_tokens(current_text)
-            current_page = seg["page_number"] or current_page
-        else:
-            current_text += ("\n\n" if current_text else "") + seg["text"]
-            current_tokens += seg["tokens"]
-            current_page = seg["page_number"] or current_page
-
-    # Final chunk
-    if current_text.strip():
-        chunks.append(TextChunk(
-            content=current_text.strip(),
-            page_number=current_page,
-            section=current_section,
-            token_count=count_tokens(current_text.strip()),
-        ))
+        if self.tokens > 0 and self.tokens + len(seg["tokens"]) > self.target:
+            closed = self._make_chunk()
+            # Overlap: carry the last `overlap` tokens into the next chunk
+            self.parts = _get_overlap(self.parts, self.overlap)
+            self.tokens = sum(len(tokens) for _, tokens in self.parts)
+
+        self.parts.append((seg["text"], seg["tokens"]))
+        self.tokens += len(seg["tokens"])
+        self.page = seg["page_number"] or self.page
+        return closed
+
+    def finish(self) -> TextChunk | None:
+        if not self.parts:
+            return None
+        chunk = self._make_chunk()
+        self.parts, self.tokens = [], 0
+        return chunk if chunk.content else None
+
+    def _make_chunk(self) -> TextChunk:
+        return TextChunk(
+            content="\n\n".join(text for text, _ in self.parts).strip(),
+            page_number=self.page,
+            section=self.section,
+            token_count=self.tokens,
+        )
+
+
+def iter_chunks(segments: Iterable[dict], target_tokens: int | None = None, overlap_tokens: int | None = None) -> Iterator[TextChunk]:
+    builder = ChunkBuilder(target_tokens, overlap_tokens)
+    for seg in segments:
+        chunk = builder.feed(seg)
+        if chunk:
+            yield chunk
+    chunk = builder.finish()
+    if chunk:
+        yield chunk
 
-    return chunks
 
+def _get_overlap(parts: list[tuple[str, list[int]]], overlap_tokens: int) -> list[tuple[str, list[int]]]:
+    """Get the parts covering at most the last overlap_tokens tokens.
 
-def _get_overlap(text: str, overlap_tokens: int) -> str:
-    """Get the last ~overlap_tokens worth of text."""
+    Whole paragraphs are kept as-is; only the earliest one is cut, at the
+    first word boundary inside its last tokens.
+    """
     if overlap_tokens <= 0:
-        return ""
-    words = text.split()
-    # Rough approximation: 1 token ≈ 0.75 words
-    word_count = int(overlap_tokens * 0.75)
-    if word_count <= 0 or word_count >= len(words):
-        return text
-    return " ".join(words[-word_count:])
-
-
-def parse_and_chunk(file_path: str, file_type: str) -> list[TextChunk]:
-    """Main entry point: parse a file and return chunks."""
+        return []
+    tail: list[tuple[str, list[int]]] = []
+    remaining = overlap_tokens
+    for text, tokens in reversed(parts):
+        if len(tokens) <= remaining:
+            tail.append((text, tokens))
+            remaining -= len(tokens)
+        else:
+            cut = _word_aligned_tail(text, tokens, remaining)
+            if cut[1]:
+                tail.append(cut)
+            remaining = 0
+        if remaining == 0:
+            break
+    return tail[::-1]
+
+
+def _word_aligned_tail(text: str, tokens: list[int], count: int) -> tuple[str, list[int]]:
+    """The paragraph's last `count` tokens, less any leading partial word.
+
+    A token cut can land inside a word, or inside a multi-byte character
+    whose leftover bytes decode to U+FFFD; either way the decoded tail is
+    not a clean suffix of the text, so the cut moves forward a token.
+    """
+    for start in range(len(tokens) - count, len(tokens)):
+        decoded = decode(tokens[start:])
+        before = text[:len(text) - len(decoded)]
+        if text.endswith(decoded) and (not before or before[-1].isspace() or decoded[0].isspace()):
+            return decoded.lstrip(), tokens[start:]
+    return "", []
+
+
+def iter_parse_and_chunk(file_path: str, file_type: str) -> Iterator[TextChunk]:
+    """Stream chunks from a file: page iterator -> segment generator -> chunk generator."""
     if file_type == "pdf":
-        pages = parse_pdf(file_path)
+        pages = iter_pdf_pages(file_path)
     elif file_type == "docx":
-        pages = parse_docx(file_path)
+        pages = iter_docx_paragraphs(file_path)
     else:
         raise ValueError(f"Unsupported file type: {file_type}")
+    return iter_chunks(iter_segments(pages))
 
-    if not pages:
-        return []
 
-    return chunk_text(pages)
+def parse_and_chunk(file_path: str, file_type: str) -> list[TextChunk]:
+    """Main entry point: parse a file and return chunks."""
+    return list(iter_parse_and_chunk(file_path, file_type))
@@ -1,22 +1,93 @@
+import asyncio
+import logging
+import random
+from collections import deque
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+from typing import TypeVar
+
+import numpy as np
+import openai
 from openai import AsyncOpenAI
 
 from config import settings
+from services import embedding_cache, metrics
+from services.cache import ArrayCache
+from services.document_processor import TextChunk
+from utils import count_tokens
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Errors worth retrying: rate limits, 5xx responses, timeouts and dropped connections
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
 
 _client: AsyncOpenAI | None = None
+_request_slots: asyncio.Semaphore | None = None
+_query_cache: ArrayCache | None = None
+_batcher: "EmbeddingBatcher | None" = None
 
 
 def _get_client() -> AsyncOpenAI:
     global _client
     if _client is None:
-        _client = AsyncOpenAI(api_key=settings.openai_api_key)
+        # Retries are handled by _embed_with_retry
+        _client = AsyncOpenAI(api_key=settings.openai_api_key, max_retries=0)
     return _client
 
 
-async def generate_embeddings(texts: list[str]) -> list[list[float]]:
-    """Generate embeddings for a list of texts using OpenAI API."""
-    if not texts:
-        return []
+def _get_request_slots() -> asyncio.Semaphore:
+    global _request_slots
+    if _request_slots is None:
+        _request_slots = asyncio.Semaphore(settings.embedding_concurrency)
+    return _request_slots
+
+
+def get_query_cache() -> ArrayCache:
+    global _query_cache
+    if _query_cache is None:
+        _query_cache = ArrayCache(
+            "query_embedding_cache",
+            max_bytes=settings.query_embedding_cache_max_mb * 1024 * 1024,
+            ttl_seconds=settings.query_embedding_cache_ttl_seconds,
+        )
+    return _query_cache
+
+
+def shorten_embedding(embedding, dimensions: int | None = None) -> np.ndarray:
+    """Truncate a Matryoshka embedding to its first dimensions and renormalize it."""
+    prefix = np.asarray(embedding, dtype=np.float32)[: dimensions or settings.embedding_short_dimensions]
+    norm = np.linalg.norm(prefix)
+    return prefix / norm if norm else prefix
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.split()).casefold()
 
+
+def _batch_full(batch_len: int, batch_tokens: int, tokens: int) -> bool:
+    return batch_len > 0 and (
+        batch_tokens + tokens > settings.embedding_max_batch_tokens
+        or batch_len >= settings.embedding_max_batch_inputs
+    )
+
+
+def pack_batches(items: Iterable[T], token_count: Callable[[T], int]) -> Iterator[list[T]]:
+    """Greedily group items into batches under the per-request token and input limits."""
+    batch: list[T] = []
+    batch_tokens = 0
+    for item in items:
+        tokens = token_count(item)
+        if _batch_full(len(batch), batch_tokens, tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+async def _embed_uncached(texts: list[str]) -> list[list[float]]:
     client = _get_client()
     response = await client.embeddings.create(
         model=settings.embedding_model,
@@ -26,7 +97,206 @@ async def generate_embeddings(texts: list[str]) -> list[list[float]]:
     return [item.embedding for item in response.data]
 
 
+def _retry_delay(attempt: int, error: Exception) -> float:
+    """Exponential backoff with jitter, never shorter than a server-sent Retry-After."""
+    backoff = settings.embedding_retry_base_delay * 2**attempt
+    delay = backoff / 2 + random.uniform(0, backoff / 2)
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+async def _embed_with_retry(texts: list[str]) -> list[list[float]]:
+    async with _get_request_slots():
+        for attempt in range(settings.embedding_max_retries + 1):
+            try:
+                return await _embed_uncached(texts)
+            except RETRYABLE_ERRORS as e:
+                if attempt == settings.embedding_max_retries:
+                    raise
+                delay = _retry_delay(attempt, e)
+                metrics.incr("embedding.retries")
+                logger.warning("Embedding request failed (%s), retrying in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+
+
+async def _embed_packed(texts: list[str], token_counts: list[int]) -> list[list[float]]:
+    """Embed texts in token-packed batches sent concurrently, preserving order."""
+    batches = list(pack_batches(zip(texts, token_counts), lambda item: item[1]))
+    if len(batches) == 1:
+        return await _embed_with_retry(texts)
+    results = await asyncio.gather(*[_embed_with_retry([t for t, _ in batch]) for batch in batches])
+    return [vector for batch in results for vector in batch]
+
+
+async def generate_embeddings(
+    texts: list[str],
+    token_counts: list[int] | None = None,
+    use_cache: bool = True,
+) -> list[list[float]]:
+    """Generate embeddings for a list of texts, reusing cached vectors where possible."""
+    if not texts:
+        return []
+    if token_counts is None:
+        token_counts = [count_tokens(t) for t in texts]
+    if not use_cache or not settings.embedding_cache_enabled:
+        return await _embed_packed(texts, token_counts)
+
+    hashes = [embedding_cache.text_hash(t) for t in texts]
+    vectors = await embedding_cache.lookup(hashes)
+
+    # Keyed by hash so repeated texts within the batch are embedded once
+    missing = {h: (t, n) for h, t, n in zip(hashes, texts, token_counts) if h not in vectors}
+    if missing:
+        missing_texts = [t for t, _ in missing.values()]
+        missing_counts = [n for _, n in missing.values()]
+        new_vectors = dict(zip(missing, await _embed_packed(missing_texts, missing_counts)))
+        await embedding_cache.store(new_vectors)
+        vectors.update(new_vectors)
+
+    return [vectors[h] for h in hashes]
+
+
+async def _as_async(items: Iterable[T] | AsyncIterable[T]) -> AsyncIterator[T]:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def iter_embedded_batches(
+    chunks: Iterable[TextChunk] | AsyncIterable[TextChunk],
+) -> AsyncIterator[tuple[list[TextChunk], list[list[float]]]]:
+    """Embed a (possibly streaming) sequence of chunks, yielding (chunks, embeddings) in order.
+
+    Chunks are packed into batches by token count as they arrive and up to
+    `embedding_concurrency` batches are in flight at once, so memory stays
+    bounded and throughput scales with the allowed concurrency.
+    """
+    pending: deque[tuple[list[TextChunk], asyncio.Task]] = deque()
+
+    def submit(batch: list[TextChunk]) -> None:
+        task = asyncio.create_task(
+            generate_embeddings([c.content for c in batch], token_counts=[c.token_count for c in batch])
+        )
+        pending.append((batch, task))
+
+    batch: list[TextChunk] = []
+    batch_tokens = 0
+    try:
+        async for chunk in _as_async(chunks):
+            if _batch_full(len(batch), batch_tokens, chunk.token_count):
+                submit(batch)
+                batch, batch_tokens = [], 0
+                if len(pending) >= settings.embedding_concurrency:
+                    done_batch, done_task = pending.popleft()
+                    yield done_batch, await done_task
+            batch.append(chunk)
+            batch_tokens += chunk.token_count
+        if batch:
+            submit(batch)
+        while pending:
+            done_batch, done_task = pending.popleft()
+            yield done_batch, await done_task
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+
+class EmbeddingBatcher:
+    """Merges concurrent single-text embedding calls into batched API requests.
+
+    The first text of a batch waits at most `window` seconds for others to
+    join it; a batch that reaches `max_size` distinct texts is sent at once.
+    Each caller's future resolves with its own vector.
+    """
+
+    def __init__(self, window: float, max_size: int):
+        self.window = window
+        self.max_size = max_size
+        self._pending: dict[str, list[asyncio.Future]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(text, []).append(future)
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: dict[str, list[asyncio.Future]]) -> None:
+        metrics.observe("embedding.query_batch_size", len(batch))
+        texts = list(batch)
+        try:
+            results = await generate_embeddings(texts, use_cache=False)
+        except openai.BadRequestError as e:
+            if len(texts) == 1:
+                results = [e]
+            else:
+                # One invalid text rejects the whole request; retry each alone so
+                # only its own callers fail
+                metrics.incr("embedding.query_batch_split")
+                results = await asyncio.gather(
+                    *[generate_embeddings([text], use_cache=False) for text in texts], return_exceptions=True
+                )
+                results = [r if isinstance(r, BaseException) else r[0] for r in results]
+        except Exception as e:
+            results = [e] * len(texts)
+        for result, futures in zip(results, batch.values()):
+            for future in futures:
+                # Skip callers that were cancelled while waiting
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+def _get_batcher() -> EmbeddingBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = EmbeddingBatcher(
+            window=settings.query_embedding_batch_window_ms / 1000,
+            max_size=settings.query_embedding_batch_max_size,
+        )
+    return _batcher
+
+
 async def generate_embedding(text: str) -> list[float]:
     """Generate embedding for a single text."""
-    result = await generate_embeddings([text])
-    return result[0]
+    # Query embeddings sit on the chat latency path, so use the in-process
+    # cache rather than the database one
+    cache = get_query_cache()
+    key = (settings.embedding_model, settings.embedding_dimensions, normalize_query(text))
+    vector = cache.get(key)
+    if vector is None:
+        if settings.query_embedding_batch_window_ms > 0:
+            # Concurrent chat requests share one API call
+            result = await _get_batcher().embed(text)
+        else:
+            result = (await generate_embeddings([text], use_cache=False))[0]
+        vector = np.asarray(result, dtype=np.float32)
+        cache.put(key, vector)
+    return vector.tolist()
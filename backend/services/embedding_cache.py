@@ -0,0 +1,84 @@
+import hashlib
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from config import settings
+from database import async_session
+from models import EmbeddingCacheEntry
+from services import metrics
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+async def lookup(hashes: list[str]) -> dict[str, list[float]]:
+    """Fetch cached embeddings for the current model in one query."""
+    if not hashes:
+        return {}
+    async with async_session() as db:
+        result = await db.execute(
+            select(EmbeddingCacheEntry.text_hash, EmbeddingCacheEntry.embedding).where(
+                EmbeddingCacheEntry.embedding_model == settings.embedding_model,
+                EmbeddingCacheEntry.embedding_dimensions == settings.embedding_dimensions,
+                EmbeddingCacheEntry.text_hash.in_(set(hashes)),
+            )
+        )
+        found = {row.text_hash: row.embedding.tolist() for row in result}
+
+    hits = sum(1 for h in hashes if h in found)
+    metrics.incr("embedding_cache.hits", hits)
+    metrics.incr("embedding_cache.misses", len(hashes) - hits)
+    return found
+
+
+async def store(embeddings: dict[str, list[float]]) -> None:
+    """Bulk-insert new embeddings, ignoring keys another writer already added."""
+    if not embeddings:
+        return
+    rows = [
+        {
+            "embedding_model": settings.embedding_model,
+            "embedding_dimensions": settings.embedding_dimensions,
+            "text_hash": h,
+            "embedding": vector,
+        }
+        for h, vector in embeddings.items()
+    ]
+    async with async_session() as db:
+        await db.execute(insert(EmbeddingCacheEntry).values(rows).on_conflict_do_nothing())
+        await db.commit()
+
+
+async def evict() -> int:
+    """Drop entries older than the max age, then the oldest beyond the max size."""
+    async with async_session() as db:
+        aged = await db.execute(
+            text("DELETE FROM embedding_cache WHERE created_at < now() - make_interval(days => :days)"),
+            {"days": settings.embedding_cache_max_age_days},
+        )
+        overflow = await db.execute(
+            text("""
+                DELETE FROM embedding_cache WHERE ctid IN (
+                    SELECT ctid FROM embedding_cache ORDER BY created_at DESC OFFSET :max_entries
+                )
+            """),
+            {"max_entries": settings.embedding_cache_max_entries},
+        )
+        await db.commit()
+    evicted = aged.rowcount + overflow.rowcount
+    metrics.incr("embedding_cache.evictions", evicted)
+    return evicted
+
+
+async def stats() -> dict:
+    async with async_session() as db:
+        entries = await db.scalar(select(func.count()).select_from(EmbeddingCacheEntry))
+    return {
+        "entries": entries,
+        "hits": metrics.get("embedding_cache.hits"),
+        "misses": metrics.get("embedding_cache.misses"),
+        "hit_rate": metrics.hit_rate("embedding_cache"),
+        "evictions": metrics.get("embedding_cache.evictions"),
+    }
@@ -0,0 +1,464 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from contextlib import aclosing
+from dataclasses import dataclass, field
+
+import numpy as np
+import openai
+from sqlalchemy import delete, func, select, text, update
+
+from config import settings
+from database import async_session
+from models import Document, DocumentChunk, IngestionJob
+from services import corpus, numpy_index
+from services.chunk_writer import ChunkWriter
+from services.document_processor import TextChunk
+from services.embedding import iter_embedded_batches
+from services.parse_pool import aiter_chunks
+
+logger = logging.getLogger(__name__)
+
+# Each queue item is a list of job ids ingested together, sharing embedding batches
+_queue: asyncio.Queue[list[uuid.UUID]] | None = None
+_workers: list[asyncio.Task] = []
+_owned: set[uuid.UUID] = set()  # jobs queued or running in this process, kept alive by _heartbeat
+
+# Session.info key for NumPy index rows to show once the session's transaction commits
+PENDING_INDEX_ROWS = "pending_numpy_index_rows"
+
+
+class IngestionError(Exception):
+    """Raised when a job fails; `stage` tells callers which step broke."""
+
+    def __init__(self, stage: str, message: str):
+        super().__init__(message)
+        self.stage = stage
+
+
+async def start_workers() -> None:
+    """Start the worker pool, take over interrupted jobs and keep this process's jobs claimed."""
+    global _queue
+    _queue = asyncio.Queue()
+    for _ in range(settings.ingestion_workers):
+        _workers.append(asyncio.create_task(_worker()))
+    await claim_stale_jobs()
+    _workers.append(asyncio.create_task(_heartbeat()))
+
+
+def group_jobs(rows) -> list[list[uuid.UUID]]:
+    """Split (job_id, batch_id) rows into queue items, oldest first; jobs of one bulk upload stay together."""
+    items: list[list[uuid.UUID]] = []
+    batches: dict[uuid.UUID, list[uuid.UUID]] = {}
+    for job_id, batch_id in rows:
+        if batch_id is None:
+            items.append([job_id])
+        elif batch_id in batches:
+            batches[batch_id].append(job_id)
+        else:
+            batches[batch_id] = [job_id]
+            items.append(batches[batch_id])
+    return items
+
+
+async def claim_stale_jobs() -> int:
+    """Queue unfinished jobs whose process stopped heartbeating, typically because it exited.
+
+    The claim is one UPDATE that refreshes the heartbeat of the rows it
+    locks; with SKIP LOCKED, processes starting together split the jobs
+    between them, and jobs held by a live process are never taken.
+    """
+    async with async_session() as db:
+        result = await db.execute(
+            text("""
+                UPDATE ingestion_jobs SET status = 'queued', stage = NULL, heartbeat_at = now()
+                WHERE id IN (
+                    SELECT id FROM ingestion_jobs
+                    WHERE status IN ('queued', 'running')
+                      AND (heartbeat_at IS NULL OR heartbeat_at < now() - make_interval(secs => :stale_seconds))
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, batch_id, created_at
+            """),
+            {"stale_seconds": settings.ingestion_heartbeat_seconds * 3},
+        )
+        claimed = sorted(result.all(), key=lambda row: row.created_at)
+        await db.commit()
+
+    _owned.update(job_id for job_id, _, _ in claimed)
+    for job_ids in group_jobs((job_id, batch_id) for job_id, batch_id, _ in claimed):
+        _queue.put_nowait(job_ids)
+    if claimed:
+        logger.info("Re-queued %d interrupted ingestion jobs", len(claimed))
+    return len(claimed)
+
+
+async def _heartbeat() -> None:
+    while True:
+        await asyncio.sleep(settings.ingestion_heartbeat_seconds)
+        try:
+            if _owned:
+                async with async_session() as db:
+                    await db.execute(
+                        update(IngestionJob)
+                        .where(IngestionJob.id.in_(list(_owned)))
+                        .values(heartbeat_at=func.now(), updated_at=IngestionJob.updated_at)
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.commit()
+            # Jobs of a process that died while this one keeps running
+            await claim_stale_jobs()
+        except Exception:
+            logger.exception("Ingestion heartbeat failed")
+
+
+async def stop_workers() -> None:
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+async def enqueue(job_ids: list[uuid.UUID]) -> None:
+    """Queue jobs to be ingested together as one unit of work."""
+    if _queue is None:
+        raise RuntimeError("Ingestion workers are not running")
+    _owned.update(job_ids)
+    await _queue.put(job_ids)
+
+
+async def find_duplicate(db, content_hash: str) -> Document | None:
+    """Return an already-ingested document with identical file contents."""
+    result = await db.execute(
+        select(Document)
+        .where(Document.content_hash == content_hash, Document.status == "ready")
+        .order_by(Document.created_at)
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def copy_chunks(db, source_id: uuid.UUID, target_id: uuid.UUID) -> int:
+    """Copy a document's chunks and embeddings to another document inside the database.
+
+    With the NumPy index, call activate_committed_rows after committing.
+    """
+    returning = "RETURNING id, embedding" if numpy_index.enabled() else ""
+    result = await db.execute(
+        text(f"""
+            INSERT INTO document_chunks
+                (id, document_id, chunk_index, content, page_number, section, token_count, embedding, embedding_short)
+            SELECT gen_random_uuid(), :target_id, chunk_index, content, page_number, section, token_count,
+                   embedding, embedding_short
+            FROM document_chunks
+            WHERE document_id = :source_id
+            {returning}
+        """),
+        {"source_id": source_id, "target_id": target_id},
+    )
+    if not returning:
+        return result.rowcount
+    rows = result.all()
+    if rows:
+        added = await asyncio.to_thread(
+            numpy_index.get_index().add, [r[0] for r in rows], [target_id] * len(rows), [r[1] for r in rows]
+        )
+        _activate_on_commit(db, added)
+    return len(rows)
+
+
+def _activate_on_commit(db, rows) -> None:
+    db.info.setdefault(PENDING_INDEX_ROWS, []).append(np.asarray(rows))
+
+
+def activate_committed_rows(db) -> None:
+    """Show the NumPy index rows queued in this session; call once its transaction has committed.
+
+    Rows of a transaction that rolls back stay hidden and are dropped by
+    the next compaction.
+    """
+    pending = db.info.pop(PENDING_INDEX_ROWS, None)
+    if pending:
+        numpy_index.get_index().activate(np.concatenate(pending))
+
+
+async def _worker() -> None:
+    while True:
+        job_ids = await _queue.get()
+        try:
+            await run_jobs(job_ids)
+        except Exception:
+            logger.exception("Ingestion of jobs %s crashed", job_ids)
+        finally:
+            _queue.task_done()
+
+
+@dataclass
+class _DocState:
+    """In-memory progress of one document while its job runs."""
+
+    job: IngestionJob
+    doc: Document
+    job_id: uuid.UUID
+    document_id: uuid.UUID
+    file_path: str
+    file_type: str
+    produced: int = 0
+    pages: int = 0
+    parsed: bool = False
+    completed: bool = False
+    vanished: bool = False  # deleted while ingesting; nothing more is written for it
+    error: IngestionError | None = None
+    index_rows: list[np.ndarray] = field(default_factory=list)  # NumPy index rows awaiting activation
+
+    @property
+    def finished(self) -> bool:
+        return self.parsed and self.job.chunks_embedded == self.produced
+
+
+@dataclass
+class _DocChunk:
+    """A chunk tagged with its document, so batches can mix documents."""
+
+    state: _DocState
+    chunk_index: int
+    chunk: TextChunk
+
+    @property
+    def content(self) -> str:
+        return self.chunk.content
+
+    @property
+    def token_count(self) -> int:
+        return self.chunk.token_count
+
+
+async def run_job(job_id: uuid.UUID) -> None:
+    """Ingest a single job, raising IngestionError if it fails."""
+    errors = await run_jobs([job_id])
+    if errors.get(job_id):
+        raise errors[job_id]
+
+
+async def run_jobs(job_ids: list[uuid.UUID]) -> dict[uuid.UUID, IngestionError | None]:
+    """Parse, embed and store the jobs' documents, persisting progress as it goes.
+
+    Documents are parsed concurrently and their chunks pooled into shared
+    embedding batches. A document that fails to parse fails on its own; an
+    embedding failure fails every document not yet completed.
+    """
+    _owned.update(job_ids)
+    try:
+        return await _run_jobs(job_ids)
+    finally:
+        _owned.difference_update(job_ids)
+
+
+async def _run_jobs(job_ids: list[uuid.UUID]) -> dict[uuid.UUID, IngestionError | None]:
+    async with async_session() as db:
+        states: list[_DocState] = []
+        for job_id in job_ids:
+            job = await db.get(IngestionJob, job_id)
+            if job is None or job.status in ("completed", "failed"):
+                continue
+            doc = await db.get(Document, job.document_id)
+            job.status = "running"
+            job.stage = "parsing"
+            job.attempts += 1
+            job.pages_parsed = job.chunks_total = job.chunks_embedded = job.rows_written = 0
+            states.append(_DocState(job, doc, job.id, doc.id, doc.file_path, doc.file_type))
+        if not states:
+            return {}
+
+        # A restarted job may have written rows before it was interrupted
+        await db.execute(delete(DocumentChunk).where(DocumentChunk.document_id.in_([s.document_id for s in states])))
+        await db.commit()
+
+        started = time.perf_counter()
+        try:
+            await _run_pipeline(db, states)
+        except Exception as e:
+            if not isinstance(e, IngestionError):
+                # Embedding API errors are already IngestionErrors; this is the database or a bug
+                logger.exception("Ingestion of jobs %s failed", job_ids)
+                e = IngestionError("storage", f"Storing document chunks failed: {e}")
+            await db.rollback()
+            db.info.pop(PENDING_INDEX_ROWS, None)
+            for state in states:
+                if not state.completed:
+                    state.error = state.error or e
+                    await _fail(db, state)
+            await db.commit()
+
+        elapsed = time.perf_counter() - started
+        succeeded = sum(1 for state in states if state.error is None and not state.vanished)
+        logger.info(
+            "Ingested %d/%d documents in %.1fs (%.1f documents/minute)",
+            succeeded, len(states), elapsed, succeeded / max(elapsed, 1e-9) * 60,
+        )
+        return {state.job_id: state.error for state in states}
+
+
+async def _run_pipeline(db, states: list[_DocState]) -> None:
+    """Stream page iterators -> chunk generators -> shared embedding batches -> COPY.
+
+    Parsing runs concurrently with embedding and writing. Producers hand
+    chunks over through a queue of at most chunk_write_batch_size items, so
+    when embedding falls behind they wait instead of piling chunks up in
+    memory. Each embedded batch is written and committed before the next.
+    Documents stay 'processing', and out of search, until all their chunks
+    are written.
+    """
+    queue: asyncio.Queue[_DocChunk | None] = asyncio.Queue(maxsize=settings.chunk_write_batch_size)
+    parse_slots = asyncio.Semaphore(settings.parse_workers)
+
+    async def produce(state: _DocState) -> None:
+        async with parse_slots:
+            try:
+                async for chunk in aiter_chunks(state.file_path, state.file_type):
+                    await queue.put(_DocChunk(state, state.produced, chunk))
+                    state.produced += 1
+                    state.pages = max(state.pages, chunk.page_number or 0)
+                if state.produced == 0:
+                    state.error = IngestionError("parsing", "No text content found in document")
+            except Exception as e:
+                state.error = IngestionError("parsing", f"Failed to parse document: {e}")
+            state.parsed = True
+            await queue.put(None)
+
+    async def merged_chunks():
+        remaining = len(states)
+        while remaining:
+            item = await queue.get()
+            if item is None:
+                remaining -= 1
+            elif item.state.error is None and not item.state.completed:
+                # Chunks queued before their document failed to parse would only be rolled back
+                yield item
+
+    producers = [asyncio.create_task(produce(state)) for state in states]
+    writer = ChunkWriter(db)
+    try:
+        async with aclosing(iter_embedded_batches(merged_chunks())) as batches:
+            async for batch, embeddings in batches:
+                await _drop_vanished(db, states)
+                written: list[tuple[_DocState, uuid.UUID, list[float]]] = []
+                for item, embedding in zip(batch, embeddings):
+                    state = item.state
+                    if state.vanished:
+                        continue
+                    if state.error is None:
+                        chunk_id = await writer.add(state.document_id, item.chunk_index, item.chunk, embedding)
+                        written.append((state, chunk_id, embedding))
+                        state.job.rows_written += 1
+                    state.job.chunks_embedded += 1
+                await writer.flush()
+                if numpy_index.enabled() and written:
+                    await _add_to_numpy_index(written)
+                await _sync_progress(db, states)
+                await db.commit()
+                activate_committed_rows(db)
+    except openai.OpenAIError as e:
+        logger.exception("Embedding generation failed")
+        raise IngestionError("embedding", f"Embedding generation failed: {e}") from e
+    finally:
+        for task in producers:
+            task.cancel()
+        await asyncio.gather(*producers, return_exceptions=True)
+
+    await _drop_vanished(db, states)
+    await _sync_progress(db, states)
+    await db.commit()
+    activate_committed_rows(db)
+
+
+async def _drop_vanished(db, states: list[_DocState]) -> None:
+    """Stop tracking documents deleted since the last commit; lock the rest until the next one.
+
+    FOR KEY SHARE holds off deletes of the remaining documents until the
+    batch commits, so their chunk COPY cannot break the foreign key. A
+    deleted document took its job row with it, so its ORM objects are
+    detached instead of flushed, and the rest of the batch carries on.
+    """
+    active = [state for state in states if not state.completed]
+    if not active:
+        return
+    result = await db.execute(
+        select(Document.id)
+        .where(Document.id.in_([state.document_id for state in active]))
+        .with_for_update(read=True, key_share=True)
+    )
+    present = set(result.scalars())
+    for state in active:
+        if state.document_id not in present:
+            logger.info("Document %s was deleted during ingestion; skipping the rest of it", state.document_id)
+            state.vanished = state.completed = True
+            db.expunge(state.job)
+            db.expunge(state.doc)
+
+
+async def _add_to_numpy_index(written: list[tuple[_DocState, uuid.UUID, list[float]]]) -> None:
+    """Append a batch's rows to the NumPy index, hidden until their documents are ready."""
+    rows = await asyncio.to_thread(
+        numpy_index.get_index().add,
+        [chunk_id for _, chunk_id, _ in written],
+        [state.document_id for state, _, _ in written],
+        [embedding for _, _, embedding in written],
+    )
+    for (state, _, _), row in zip(written, rows):
+        state.index_rows.append(row)
+
+
+async def _sync_progress(db, states: list[_DocState]) -> None:
+    """Copy producer counters onto the jobs and settle finished documents."""
+    became_ready = False
+    for state in states:
+        if state.completed:
+            continue
+        job = state.job
+        job.chunks_total = state.produced
+        job.pages_parsed = state.pages
+        if state.error is not None:
+            if state.parsed:
+                await _fail(db, state)
+            continue
+        if job.chunks_embedded:
+            job.stage = "embedding"
+        if state.finished:
+            if state.doc.page_count is None and state.pages:
+                state.doc.page_count = state.pages
+            job.status = "completed"
+            job.stage = None
+            state.doc.chunk_count = job.rows_written
+            state.doc.status = "ready"
+            if state.index_rows:
+                _activate_on_commit(db, state.index_rows)
+            state.completed = True
+            became_ready = True
+    if became_ready:
+        await corpus.bump_version(db)
+
+
+async def _fail(db, state: _DocState) -> None:
+    """Record a document's failure and drop any rows it had written."""
+    state.completed = True
+    # Plain UPDATEs: after a rollback the ORM objects are expired
+    await db.execute(
+        update(IngestionJob)
+        .where(IngestionJob.id == state.job_id)
+        .values(status="failed", stage=state.error.stage, error=str(state.error))
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(Document)
+        .where(Document.id == state.document_id)
+        .values(status="failed")
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(delete(DocumentChunk).where(DocumentChunk.document_id == state.document_id))
+    if numpy_index.enabled():
+        await asyncio.to_thread(numpy_index.get_index().remove_document, state.document_id)
+    if os.path.exists(state.file_path):
+        os.remove(state.file_path)
@@ -1,9 +1,14 @@
+import time
+
 import anthropic
 
 from config import settings
+from services import metrics
 
 _client: anthropic.AsyncAnthropic | None = None
 
+CACHE_CONTROL = {"type": "ephemeral"}
+
 SYSTEM_PROMPT = """You are a legal AI assistant that helps lawyers with document analysis, drafting, research, and general legal tasks. Follow these rules:
 
 1. When document excerpts are provided, ground your answers in them and cite sources using [N] notation (e.g., [1], [2]). Use exact text when quoting.
@@ -20,6 +25,10 @@ SYSTEM_PROMPT = """You are a legal AI assistant that helps lawyers with document
 
 7. You are an AI assistant, not a lawyer. Your responses assist licensed attorneys and do not constitute legal advice."""
 
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a lawyer and a legal AI assistant. Update the existing summary with the new messages. Keep the parties, documents, defined terms, facts, decisions, open questions and any drafting instructions the user gave; drop pleasantries and repetition. Write plain prose, at most a few paragraphs, and output only the summary."""
+
+SYSTEM = [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}]
+
 
 def _get_client() -> anthropic.AsyncAnthropic:
     global _client
@@ -41,29 +50,58 @@ If the request is about the documents above, ground your answer in the excerpts
         return user_message
 
 
+def _system(summary: str | None) -> list[dict]:
+    if not summary:
+        return SYSTEM
+    return [*SYSTEM, {"type": "text", "text": f"Summary of the earlier conversation:\n{summary}"}]
+
+
+def _build_messages(
+    user_message: str,
+    context: str,
+    conversation_history: list[dict] | None,
+    has_documents: bool,
+) -> list[dict]:
+    """Messages with a cache breakpoint after the history.
+
+    Retrieved context changes every turn, so it goes in the final message
+    only; system prompt, summary and history form a prefix that the next
+    turn reads back from the prompt cache.
+    """
+    messages = [
+        {"role": msg["role"], "content": [{"type": "text", "text": msg["content"]}]}
+        for msg in conversation_history or []
+    ]
+    if messages:
+        messages[-1]["content"][-1]["cache_control"] = CACHE_CONTROL
+    messages.append({"role": "user", "content": _build_augmented_message(user_message, context, has_documents)})
+    return messages
+
+
+def _record_usage(usage: anthropic.types.Usage) -> None:
+    metrics.incr("llm.input_tokens", usage.input_tokens)
+    metrics.incr("llm.output_tokens", usage.output_tokens)
+    metrics.incr("llm.cache_read_input_tokens", usage.cache_read_input_tokens or 0)
+    metrics.incr("llm.cache_creation_input_tokens", usage.cache_creation_input_tokens or 0)
+
+
 async def chat_with_context(
     user_message: str,
     context: str,
     conversation_history: list[dict] | None = None,
     has_documents: bool = False,
+    summary: str | None = None,
 ) -> str:
     """Send a message to Claude with optional document context."""
     client = _get_client()
 
-    messages = []
-
-    if conversation_history:
-        for msg in conversation_history[-10:]:
-            messages.append({"role": msg["role"], "content": msg["content"]})
-
-    messages.append({"role": "user", "content": _build_augmented_message(user_message, context, has_documents)})
-
     response = await client.messages.create(
         model="claude-sonnet-4-5-20250929",
         max_tokens=4096,
-        system=SYSTEM_PROMPT,
-        messages=messages,
+        system=_system(summary),
+        messages=_build_messages(user_message, context, conversation_history, has_documents),
     )
+    _record_usage(response.usage)
 
     return response.content[0].text
 
@@ -73,23 +111,46 @@ async def stream_chat_with_context(
     context: str,
     conversation_history: list[dict] | None = None,
     has_documents: bool = False,
+    summary: str | None = None,
 ):
     """Stream a response from Claude with optional document context."""
     client = _get_client()
 
-    messages = []
-
-    if conversation_history:
-        for msg in conversation_history[-10:]:
-            messages.append({"role": msg["role"], "content": msg["content"]})
-
-    messages.append({"role": "user", "content": _build_augmented_message(user_message, context, has_documents)})
-
+    start = time.perf_counter()
+    first_token = None
     async with client.messages.stream(
         model="claude-sonnet-4-5-20250929",
         max_tokens=4096,
-        system=SYSTEM_PROMPT,
-        messages=messages,
+        system=_system(summary),
+        messages=_build_messages(user_message, context, conversation_history, has_documents),
     ) as stream:
         async for text in stream.text_stream:
+            if first_token is None:
+                first_token = time.perf_counter() - start
             yield text
+        usage = (await stream.get_final_message()).usage
+    _record_usage(usage)
+    if first_token is not None:
+        # Split by whether the prefix came from the cache, to show what caching saves
+        cached = "cached" if usage.cache_read_input_tokens else "uncached"
+        metrics.observe(f"llm.time_to_first_token.{cached}.seconds", first_token)
+
+
+async def summarize_conversation(summary: str | None, messages: list[dict]) -> str:
+    """Fold `messages` into the running `summary` of a conversation."""
+    client = _get_client()
+
+    transcript = "\n\n".join(f"{msg['role'].upper()}: {msg['content']}" for msg in messages)
+    response = await client.messages.create(
+        model=settings.summary_model,
+        max_tokens=settings.summary_max_tokens,
+        system=SUMMARY_PROMPT,
+        messages=[{
+            "role": "user",
+            "content": f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}",
+        }],
+    )
+    metrics.incr("llm.summary_input_tokens", response.usage.input_tokens)
+    metrics.incr("llm.summary_output_tokens", response.usage.output_tokens)
+
+    return response.content[0].text
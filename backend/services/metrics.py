@@ -0,0 +1,42 @@
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+# Process-local counters; each uvicorn worker reports its own.
+_counters: dict[str, float] = defaultdict(float)
+
+
+def incr(name: str, amount: float = 1) -> None:
+    _counters[name] += amount
+
+
+def observe(name: str, value: float) -> None:
+    """Record one sample; the snapshot shows its count, total and max."""
+    _counters[f"{name}.count"] += 1
+    _counters[f"{name}.total"] += value
+    _counters[f"{name}.max"] = max(_counters[f"{name}.max"], value)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Observe the wall-clock seconds spent in the block as `<name>.seconds`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(f"{name}.seconds", time.perf_counter() - start)
+
+
+def get(name: str) -> float:
+    return _counters.get(name, 0)
+
+
+def hit_rate(prefix: str) -> float | None:
+    hits, misses = get(f"{prefix}.hits"), get(f"{prefix}.misses")
+    total = hits + misses
+    return hits / total if total else None
+
+
+def snapshot() -> dict[str, float]:
+    return dict(sorted(_counters.items()))
@@ -0,0 +1,235 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+from sqlalchemy import text
+
+from config import settings
+from database import async_session
+
+logger = logging.getLogger(__name__)
+
+UUID_DTYPE = np.dtype("V16")
+
+_index: "NumpyVectorIndex | None" = None
+
+
+def _uuid_array(ids) -> np.ndarray:
+    return np.frombuffer(b"".join(uuid.UUID(str(i)).bytes for i in ids), dtype=UUID_DTYPE)
+
+
+class NumpyVectorIndex:
+    """In-process cosine index over a memory-mapped float32 matrix.
+
+    Rows are append-only files in `path`: normalized vectors, chunk ids,
+    document ids and a tombstone byte per row. Rows are added tombstoned and
+    made visible with `activate` once their document is ready; deleted
+    documents are tombstoned and dropped by `compact`. The index lives in one
+    process, so it suits single-node, single-worker deployments.
+    """
+
+    FILES = ("vectors.f32", "chunk_ids.bin", "document_ids.bin", "deleted.u8")
+
+    def __init__(self, path: str, dimensions: int):
+        self.path = path
+        self.dimensions = dimensions
+        self._lock = threading.Lock()
+        # Finish a compaction interrupted between its two renames
+        if not os.path.exists(path) and os.path.exists(self._staging_path()):
+            os.rename(self._staging_path(), path)
+        os.makedirs(path, exist_ok=True)
+        self._check_meta()
+        self._open()
+
+    def _staging_path(self) -> str:
+        return f"{self.path.rstrip(os.sep)}.compact"
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _check_meta(self) -> None:
+        meta_path = self._file("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                if json.load(f)["dimensions"] != self.dimensions:
+                    raise ValueError(f"Index at {self.path} has different dimensions; remove it to rebuild")
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"dimensions": self.dimensions}, f)
+        for name in self.FILES:
+            open(self._file(name), "ab").close()
+
+    def _open(self) -> None:
+        # The tombstone file is written last, so its length is the committed row count;
+        # longer files hold the tail of an interrupted append
+        count = os.path.getsize(self._file("deleted.u8"))
+        row_bytes = {"vectors.f32": self.dimensions * 4, "chunk_ids.bin": 16, "document_ids.bin": 16}
+        for name, size in row_bytes.items():
+            actual = os.path.getsize(self._file(name))
+            if actual < count * size:
+                raise ValueError(f"Vector index file {name} is truncated; remove {self.path} to rebuild")
+            if actual > count * size:
+                os.truncate(self._file(name), count * size)
+        if count == 0:
+            maps = (
+                np.empty((0, self.dimensions), dtype=np.float32),
+                np.empty(0, dtype=UUID_DTYPE),
+                np.empty(0, dtype=UUID_DTYPE),
+                np.empty(0, dtype=np.uint8),
+            )
+        else:
+            maps = (
+                np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(count, self.dimensions)),
+                np.memmap(self._file("chunk_ids.bin"), dtype=UUID_DTYPE, mode="r", shape=(count,)),
+                np.memmap(self._file("document_ids.bin"), dtype=UUID_DTYPE, mode="r", shape=(count,)),
+                np.memmap(self._file("deleted.u8"), dtype=np.uint8, mode="r+", shape=(count,)),
+            )
+        # One assignment, so lock-free readers see either the old maps or the new ones
+        self._maps = maps
+
+    @property
+    def count(self) -> int:
+        return len(self._maps[3])
+
+    def __len__(self) -> int:
+        deleted = self._maps[3]
+        return int(len(deleted) - deleted.sum())
+
+    def add(self, chunk_ids: list, document_ids: list, embeddings) -> np.ndarray:
+        """Append tombstoned rows and return their row numbers for `activate`."""
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimensions)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        with self._lock:
+            start = self.count
+            for name, data in (
+                ("vectors.f32", vectors.tobytes()),
+                ("chunk_ids.bin", _uuid_array(chunk_ids).tobytes()),
+                ("document_ids.bin", _uuid_array(document_ids).tobytes()),
+                ("deleted.u8", np.ones(len(vectors), dtype=np.uint8).tobytes()),
+            ):
+                with open(self._file(name), "ab") as f:
+                    f.write(data)
+            self._open()
+        return np.arange(start, start + len(vectors))
+
+    def activate(self, rows) -> None:
+        with self._lock:
+            deleted = self._maps[3]
+            deleted[np.asarray(rows, dtype=np.int64)] = 0
+            deleted.flush()
+
+    def remove_document(self, document_id) -> int:
+        """Tombstone every row of a document; returns how many were visible."""
+        with self._lock:
+            _, _, doc_ids, deleted = self._maps
+            if len(deleted) == 0:
+                return 0
+            rows = doc_ids == _uuid_array([document_id])[0]
+            removed = int((deleted[rows] == 0).sum())
+            deleted[rows] = 1
+            deleted.flush()
+        return removed
+
+    def search(self, query, k: int, document_ids: list | None = None) -> list[tuple[uuid.UUID, float]]:
+        """Top-k (chunk_id, cosine similarity), best first."""
+        # One read of the maps, so a concurrent add or compact can't mix generations mid-query
+        vectors, chunk_ids, doc_ids, deleted = self._maps
+        if len(vectors) == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+
+        scores = vectors @ query
+        visible = deleted == 0
+        if document_ids:
+            visible &= np.isin(doc_ids, _uuid_array(document_ids))
+        scores = np.where(visible, scores, -np.inf)
+
+        k = min(k, int(visible.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(uuid.UUID(bytes=chunk_ids[i].tobytes()), float(scores[i])) for i in top]
+
+    def compact(self) -> int:
+        """Rewrite the index without tombstoned rows; returns how many were dropped.
+
+        The new files are written to a sibling directory that is swapped in,
+        so a crash leaves either the old index or the new one.
+        """
+        with self._lock:
+            vectors, chunk_ids, doc_ids, deleted = self._maps
+            keep = np.flatnonzero(deleted == 0)
+            dropped = len(deleted) - len(keep)
+            if dropped == 0:
+                return 0
+            staging = self._staging_path()
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            vectors[keep].tofile(os.path.join(staging, "vectors.f32"))
+            chunk_ids[keep].tofile(os.path.join(staging, "chunk_ids.bin"))
+            doc_ids[keep].tofile(os.path.join(staging, "document_ids.bin"))
+            np.zeros(len(keep), dtype=np.uint8).tofile(os.path.join(staging, "deleted.u8"))
+            shutil.copy(self._file("meta.json"), staging)
+
+            retired = f"{self.path.rstrip(os.sep)}.old"
+            shutil.rmtree(retired, ignore_errors=True)
+            os.rename(self.path, retired)
+            os.rename(staging, self.path)
+            shutil.rmtree(retired)
+            self._open()
+        logger.info("Compacted vector index: dropped %d rows, %d remain", dropped, len(keep))
+        return dropped
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "rows": int(self.count),
+            "visible": len(self),
+            "size_bytes": int(self._maps[0].nbytes),
+        }
+
+
+def enabled() -> bool:
+    return settings.vector_backend == "numpy"
+
+
+def get_index() -> NumpyVectorIndex:
+    global _index
+    if _index is None:
+        _index = NumpyVectorIndex(settings.numpy_index_dir, settings.embedding_dimensions)
+    return _index
+
+
+async def load() -> None:
+    """Map the index at startup, building it from Postgres if it is empty.
+
+    Compaction first drops rows of deleted documents and of ingestions that
+    never completed; their jobs re-add them when they resume.
+    """
+    index = await asyncio.to_thread(get_index)
+    await asyncio.to_thread(index.compact)
+    if index.count == 0:
+        await rebuild_from_database(index)
+    logger.info("NumPy vector index ready: %d chunks", len(index))
+
+
+async def rebuild_from_database(index: NumpyVectorIndex, batch_size: int = 10_000) -> None:
+    """Stream every ready chunk's embedding from Postgres into the index."""
+    async with async_session() as db:
+        result = await db.stream(text("""
+            SELECT dc.id, dc.document_id, dc.embedding
+            FROM document_chunks dc
+            JOIN documents d ON d.id = dc.document_id
+            WHERE d.status = 'ready' AND dc.embedding IS NOT NULL
+        """))
+        async for rows in result.partitions(batch_size):
+            added = await asyncio.to_thread(index.add, [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows])
+            await asyncio.to_thread(index.activate, added)
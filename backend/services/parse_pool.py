@@ -0,0 +1,102 @@
+import asyncio
+import multiprocessing
+from collections import deque
+from collections.abc import AsyncIterator
+from concurrent.futures import ProcessPoolExecutor
+
+from config import settings
+from services.document_processor import (
+    ChunkBuilder,
+    TextChunk,
+    parse_docx,
+    parse_pdf_range,
+    pdf_page_count,
+    split_segments,
+)
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, not fork: the parent process runs an event loop and DB connections
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.parse_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+def _segment_pdf_range(file_path: str, start: int, end: int) -> list[dict]:
+    return split_segments(parse_pdf_range(file_path, start, end))
+
+
+def _segment_docx(file_path: str) -> list[dict]:
+    return split_segments(parse_docx(file_path))
+
+
+async def _iter_segment_parts(file_path: str, file_type: str) -> AsyncIterator[list[dict]]:
+    """Yield tokenized segments per page range, in page order.
+
+    At most two ranges per worker are in flight, so read-ahead stays bounded
+    however long the document is.
+    """
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+
+    if file_type == "docx":
+        yield await loop.run_in_executor(executor, _segment_docx, file_path)
+        return
+    if file_type != "pdf":
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+    page_count = await loop.run_in_executor(executor, pdf_page_count, file_path)
+    step = settings.parse_pages_per_task
+    starts = iter(range(0, page_count, step))
+    pending: deque[asyncio.Future] = deque()
+    try:
+        while True:
+            while len(pending) < settings.parse_workers * 2:
+                start = next(starts, None)
+                if start is None:
+                    break
+                pending.append(loop.run_in_executor(
+                    executor, _segment_pdf_range, file_path, start, min(start + step, page_count)
+                ))
+            if not pending:
+                return
+            yield await pending.popleft()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def aiter_chunks(file_path: str, file_type: str) -> AsyncIterator[TextChunk]:
+    """Stream chunks of a file, extracting and tokenizing page ranges on the process pool.
+
+    Ranges are processed in parallel but merged in page order, so the chunks
+    match `parse_and_chunk` exactly; the first chunks are available before
+    the last page is parsed.
+    """
+    builder = ChunkBuilder()
+    async for segments in _iter_segment_parts(file_path, file_type):
+        for seg in segments:
+            chunk = builder.feed(seg)
+            if chunk:
+                yield chunk
+    chunk = builder.finish()
+    if chunk:
+        yield chunk
+
+
+async def parse_and_chunk_async(file_path: str, file_type: str) -> list[TextChunk]:
+    """Parse and chunk a file on the process pool without blocking the event loop."""
+    return [chunk async for chunk in aiter_chunks(file_path, file_type)]
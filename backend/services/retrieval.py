@@ -1,8 +1,118 @@
+import asyncio
+import sys
+import time
+import uuid
+
+import numpy as np
 from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from config import settings
+from database import async_session
 from models import DocumentChunk, Document
-from services.embedding import generate_embedding
+from services import corpus, metrics, numpy_index, vector_index
+from services.cache import LRUCache
+from services.embedding import generate_embedding, normalize_query, shorten_embedding
+
+RRF_K = 60  # Reciprocal rank fusion constant
+
+_retrieval_cache: LRUCache | None = None
+
+
+# Restricts candidate chunks to ready documents without joining documents
+READY_FILTER = "EXISTS (SELECT 1 FROM documents d WHERE d.id = dc.document_id AND d.status = 'ready')"
+
+
+def _document_filter(document_ids: list[str] | None) -> tuple[str, dict]:
+    """SQL condition and params limiting chunks to document_ids, bound as one uuid[] parameter."""
+    if not document_ids:
+        return "", {}
+    return "AND dc.document_id = ANY(:document_ids)", {"document_ids": [uuid.UUID(str(d)) for d in document_ids]}
+
+
+def _vector_candidates_sql(filters: str, exact: bool) -> str:
+    """Ids and distances of the :candidates chunks nearest :embedding."""
+    if exact:
+        # MATERIALIZED keeps the ANN index out of the plan: distances are computed
+        # for the filtered chunks only, then sorted
+        return f"""
+            WITH scoped AS MATERIALIZED (
+                SELECT dc.id, dc.embedding <=> :embedding AS distance
+                FROM document_chunks dc
+                WHERE dc.embedding IS NOT NULL AND {READY_FILTER} {filters}
+            )
+            SELECT id, distance FROM scoped ORDER BY distance LIMIT :candidates
+        """
+    quantized = vector_index.quantized_order_by()
+    if quantized:
+        short = settings.vector_quantization == "short"
+        shortlist = f"""
+            SELECT dc.id, dc.embedding
+            FROM document_chunks dc
+            WHERE dc.{"embedding_short" if short else "embedding"} IS NOT NULL AND {READY_FILTER} {filters}
+            ORDER BY {quantized}
+            LIMIT :rescore_candidates
+        """
+        if short:
+            # Chunks written before embedding_short existed are missing from its
+            # index until the backfill reaches them; score those exactly instead
+            shortlist = f"""
+                ({shortlist})
+                UNION ALL
+                SELECT dc.id, dc.embedding
+                FROM document_chunks dc
+                WHERE dc.embedding_short IS NULL AND dc.embedding IS NOT NULL AND {READY_FILTER} {filters}
+            """
+        # First stage walks the compact halfvec/bit/short-prefix index; the
+        # shortlist is rescored against the full-precision vectors
+        return f"""
+            SELECT s.id, s.embedding <=> :embedding AS distance
+            FROM ({shortlist}) s
+            ORDER BY distance
+            LIMIT :candidates
+        """
+    return f"""
+        SELECT dc.id, dc.embedding <=> :embedding AS distance
+        FROM document_chunks dc
+        WHERE dc.embedding IS NOT NULL AND {READY_FILTER} {filters}
+        ORDER BY dc.embedding <=> :embedding
+        LIMIT :candidates
+    """
+
+
+def _rescore_candidates(candidates: int) -> int:
+    if settings.vector_quantization == "none":
+        return candidates
+    return candidates * settings.vector_rescore_factor
+
+
+async def _prepare_vector_scan(
+    db: AsyncSession,
+    document_ids: list[str] | None,
+    candidates: int,
+    read_version: bool = False,
+) -> tuple[bool, int | None]:
+    """Set up this query's vector scan in one round trip; returns (exact, corpus version).
+
+    The same statement sets the ANN parameters, counts the chunks of the
+    selected documents and, if asked, reads the corpus version for the
+    retrieval cache. Selections under exact_search_max_chunks are scanned
+    exactly: a selective filter under an ANN index can return fewer than
+    `limit` rows, while scanning a few thousand chunks via the document_id
+    index is both exact and fast.
+    """
+    # Filtered ANN scans keep walking the index until enough rows pass the filter
+    columns, params = vector_index.search_params_sql(_rescore_candidates(candidates), iterative=bool(document_ids))
+    if document_ids:
+        columns.append("(SELECT coalesce(sum(chunk_count), 0) FROM documents WHERE id = ANY(:document_ids)) AS selected_chunks")
+        params.update(_document_filter(document_ids)[1])
+    if read_version:
+        columns.append(f"({corpus.VERSION_SQL}) AS version")
+    row = (await db.execute(text(f"SELECT {', '.join(columns)}"), params)).mappings().one()
+
+    exact = bool(document_ids) and row["selected_chunks"] <= settings.exact_search_max_chunks
+    metrics.incr("retrieval.exact_scans" if exact else "retrieval.ann_scans")
+    return exact, row.get("version")
 
 
 async def vector_search(
@@ -10,27 +120,36 @@ async def vector_search(
     db: AsyncSession,
     limit: int = 10,
     document_ids: list[str] | None = None,
+    exact: bool | None = None,
 ) -> list[dict]:
-    """Search for similar chunks using pgvector cosine distance."""
-    embedding_str = "[" + ",".join(str(x) for x in query_embedding) + "]"
+    """Search for similar chunks using pgvector cosine distance.
 
-    filters = ""
-    if document_ids:
-        ids = ",".join(f"'{did}'" for did in document_ids)
-        filters = f"AND dc.document_id IN ({ids})"
+    `exact` is the scan choice when _prepare_vector_scan already ran in this transaction.
+    """
+    # Sent as packed float32 by the binary vector codec
+    embedding = np.asarray(query_embedding, dtype=np.float32)
+    if numpy_index.enabled():
+        return await _numpy_vector_search(embedding, db, limit, document_ids)
+    filters, params = _document_filter(document_ids)
+    if exact is None:
+        exact, _ = await _prepare_vector_scan(db, document_ids, limit)
 
     query = text(f"""
         SELECT dc.id, dc.document_id, dc.content, dc.page_number, dc.section,
-               dc.chunk_index, d.filename,
-               dc.embedding <=> :embedding AS distance
-        FROM document_chunks dc
+               dc.chunk_index, dc.token_count, d.filename, v.distance
+        FROM ({_vector_candidates_sql(filters, exact)}) v
+        JOIN document_chunks dc ON dc.id = v.id
         JOIN documents d ON d.id = dc.document_id
-        WHERE dc.embedding IS NOT NULL {filters}
-        ORDER BY dc.embedding <=> :embedding
-        LIMIT :limit
+        ORDER BY v.distance
     """)
 
-    result = await db.execute(query, {"embedding": embedding_str, "limit": limit})
+    result = await db.execute(query, {
+        "embedding": embedding,
+        "embedding_short": shorten_embedding(embedding),
+        "candidates": limit,
+        "rescore_candidates": _rescore_candidates(limit),
+        **params,
+    })
     rows = result.mappings().all()
 
     return [
@@ -42,36 +161,73 @@ async def vector_search(
             "page_number": row["page_number"],
             "section": row["section"],
             "chunk_index": row["chunk_index"],
+            "token_count": row["token_count"],
             "score": 1 - float(row["distance"]),  # Convert distance to similarity
         }
         for row in rows
     ]
 
 
+async def _numpy_vector_search(
+    embedding: np.ndarray,
+    db: AsyncSession,
+    limit: int,
+    document_ids: list[str] | None,
+) -> list[dict]:
+    """Rank in the in-process NumPy index, then fetch the winning chunks from Postgres."""
+    hits = await asyncio.to_thread(numpy_index.get_index().search, embedding, limit, document_ids)
+    if not hits:
+        return []
+
+    result = await db.execute(text("""
+        SELECT dc.id, dc.document_id, dc.content, dc.page_number, dc.section,
+               dc.chunk_index, dc.token_count, d.filename
+        FROM document_chunks dc
+        JOIN documents d ON d.id = dc.document_id
+        WHERE dc.id = ANY(:chunk_ids) AND d.status = 'ready'
+    """), {"chunk_ids": [chunk_id for chunk_id, _ in hits]})
+    rows = {row["id"]: row for row in result.mappings().all()}
+
+    return [
+        {
+            "chunk_id": str(row["id"]),
+            "document_id": str(row["document_id"]),
+            "filename": row["filename"],
+            "content": row["content"],
+            "page_number": row["page_number"],
+            "section": row["section"],
+            "chunk_index": row["chunk_index"],
+            "token_count": row["token_count"],
+            "score": score,
+        }
+        for chunk_id, score in hits
+        if (row := rows.get(chunk_id)) is not None
+    ]
+
+
 async def keyword_search(
     query: str,
     db: AsyncSession,
     limit: int = 10,
     document_ids: list[str] | None = None,
 ) -> list[dict]:
-    """Full-text search using PostgreSQL tsvector."""
-    filters = ""
-    if document_ids:
-        ids = ",".join(f"'{did}'" for did in document_ids)
-        filters = f"AND dc.document_id IN ({ids})"
+    """Full-text search over the GIN-indexed content_tsv column."""
+    filters, params = _document_filter(document_ids)
 
     sql = text(f"""
         SELECT dc.id, dc.document_id, dc.content, dc.page_number, dc.section,
-               dc.chunk_index, d.filename,
-               ts_rank(to_tsvector('english', dc.content), plainto_tsquery('english', :query)) AS rank
+               dc.chunk_index, dc.token_count, d.filename,
+               ts_rank(dc.content_tsv, q.query) AS rank
         FROM document_chunks dc
-        JOIN documents d ON d.id = dc.document_id
-        WHERE to_tsvector('english', dc.content) @@ plainto_tsquery('english', :query) {filters}
+        JOIN documents d ON d.id = dc.document_id,
+             plainto_tsquery('english', :query) AS q(query)
+        WHERE dc.content_tsv @@ q.query
+          AND d.status = 'ready' {filters}
         ORDER BY rank DESC
         LIMIT :limit
     """)
 
-    result = await db.execute(sql, {"query": query, "limit": limit})
+    result = await db.execute(sql, {"query": query, "limit": limit, **params})
     rows = result.mappings().all()
 
     return [
@@ -83,38 +239,23 @@ async def keyword_search(
             "page_number": row["page_number"],
             "section": row["section"],
             "chunk_index": row["chunk_index"],
+            "token_count": row["token_count"],
             "score": float(row["rank"]),
         }
         for row in rows
     ]
 
 
-async def hybrid_search(
-    query: str,
-    db: AsyncSession,
-    limit: int = 8,
-    document_ids: list[str] | None = None,
-) -> list[dict]:
-    """Combine vector and keyword search results with reciprocal rank fusion."""
-    query_embedding = await generate_embedding(query)
-
-    vector_results = await vector_search(query_embedding, db, limit=limit * 2, document_ids=document_ids)
-    keyword_results = await keyword_search(query, db, limit=limit * 2, document_ids=document_ids)
-
-    # Reciprocal Rank Fusion
-    k = 60  # RRF constant
+def _rrf_fuse(result_lists: list[list[dict]], limit: int, k: int = RRF_K) -> list[dict]:
+    """Reciprocal rank fusion of ranked result lists."""
     scores: dict[str, float] = {}
     chunk_data: dict[str, dict] = {}
 
-    for rank, result in enumerate(vector_results):
-        cid = result["chunk_id"]
-        scores[cid] = scores.get(cid, 0) + 1 / (k + rank + 1)
-        chunk_data[cid] = result
-
-    for rank, result in enumerate(keyword_results):
-        cid = result["chunk_id"]
-        scores[cid] = scores.get(cid, 0) + 1 / (k + rank + 1)
-        chunk_data[cid] = result
+    for results in result_lists:
+        for rank, result in enumerate(results):
+            cid = result["chunk_id"]
+            scores[cid] = scores.get(cid, 0) + 1 / (k + rank + 1)
+            chunk_data[cid] = result
 
     # Sort by fused score and return top results
     sorted_ids = sorted(scores, key=lambda x: scores[x], reverse=True)[:limit]
@@ -126,3 +267,202 @@ async def hybrid_search(
         results.append(entry)
 
     return results
+
+
+async def fused_search(
+    query: str,
+    query_embedding: list[float],
+    db: AsyncSession,
+    limit: int = 8,
+    document_ids: list[str] | None = None,
+    exact: bool | None = None,
+) -> list[dict]:
+    """Hybrid search in one query: both candidate lists and RRF run in SQL.
+
+    Candidates carry only chunk ids and ranks; documents are joined and
+    content is fetched for the fused top `limit` rows only. Unless `exact`
+    comes from an earlier _prepare_vector_scan in this transaction, that
+    setup costs one more round trip.
+    """
+    # Sent as packed float32 by the binary vector codec
+    embedding = np.asarray(query_embedding, dtype=np.float32)
+    filters, params = _document_filter(document_ids)
+    if exact is None:
+        exact, _ = await _prepare_vector_scan(db, document_ids, limit * 2)
+
+    sql = text(f"""
+        WITH vector_hits AS (
+            SELECT id, row_number() OVER (ORDER BY distance) AS rank
+            FROM ({_vector_candidates_sql(filters, exact)}) v
+        ),
+        keyword_hits AS (
+            SELECT id, row_number() OVER (ORDER BY rank DESC) AS rank
+            FROM (
+                SELECT dc.id, ts_rank(dc.content_tsv, q.query) AS rank
+                FROM document_chunks dc, plainto_tsquery('english', :query) AS q(query)
+                WHERE dc.content_tsv @@ q.query AND {READY_FILTER} {filters}
+                ORDER BY rank DESC
+                LIMIT :candidates
+            ) k
+        ),
+        fused AS (
+            SELECT id, sum(1.0 / (:rrf_k + rank)) AS score
+            FROM (
+                SELECT id, rank FROM vector_hits
+                UNION ALL
+                SELECT id, rank FROM keyword_hits
+            ) hits
+            GROUP BY id
+            ORDER BY score DESC
+            LIMIT :limit
+        )
+        SELECT dc.id, dc.document_id, dc.content, dc.page_number, dc.section,
+               dc.chunk_index, dc.token_count, d.filename, f.score
+        FROM fused f
+        JOIN document_chunks dc ON dc.id = f.id
+        JOIN documents d ON d.id = dc.document_id
+        ORDER BY f.score DESC
+    """)
+
+    result = await db.execute(sql, {
+        "embedding": embedding,
+        "query": query,
+        "embedding_short": shorten_embedding(embedding),
+        "candidates": limit * 2,
+        "rescore_candidates": _rescore_candidates(limit * 2),
+        "rrf_k": RRF_K,
+        "limit": limit,
+        **params,
+    })
+    rows = result.mappings().all()
+
+    return [
+        {
+            "chunk_id": str(row["id"]),
+            "document_id": str(row["document_id"]),
+            "filename": row["filename"],
+            "content": row["content"],
+            "page_number": row["page_number"],
+            "section": row["section"],
+            "chunk_index": row["chunk_index"],
+            "token_count": row["token_count"],
+            "score": float(row["score"]),
+        }
+        for row in rows
+    ]
+
+
+async def _concurrent_search(
+    query: str,
+    db: AsyncSession,
+    limit: int,
+    document_ids: list[str] | None,
+) -> list[dict]:
+    """Run keyword search while the query is embedded, then vector search on its own connection."""
+
+    async def vector_branch() -> list[dict]:
+        with metrics.timed("retrieval.vector_branch"):
+            with metrics.timed("retrieval.embedding"):
+                query_embedding = await generate_embedding(query)
+            # A session can't run two queries at once, so this branch gets its own
+            async with async_session() as vector_db:
+                with metrics.timed("retrieval.vector_query"):
+                    return await vector_search(query_embedding, vector_db, limit=limit * 2, document_ids=document_ids)
+
+    async def keyword_branch() -> list[dict]:
+        with metrics.timed("retrieval.keyword_branch"):
+            return await keyword_search(query, db, limit=limit * 2, document_ids=document_ids)
+
+    vector_results, keyword_results = await asyncio.gather(vector_branch(), keyword_branch())
+    return _rrf_fuse([vector_results, keyword_results], limit)
+
+
+def _results_size(entry: tuple[list[dict], float]) -> int:
+    results, _ = entry
+    return sum(sys.getsizeof(r) + sum(sys.getsizeof(v) for v in r.values()) for r in results)
+
+
+def get_retrieval_cache() -> LRUCache:
+    global _retrieval_cache
+    if _retrieval_cache is None:
+        _retrieval_cache = LRUCache(
+            "retrieval_cache",
+            max_bytes=settings.retrieval_cache_max_mb * 1024 * 1024,
+            ttl_seconds=settings.retrieval_cache_ttl_seconds,
+            sizeof=_results_size,
+        )
+    return _retrieval_cache
+
+
+def retrieval_cache_stats() -> dict:
+    return {**get_retrieval_cache().stats(), "saved_seconds": metrics.get("retrieval_cache.saved_seconds")}
+
+
+async def hybrid_search(
+    query: str,
+    db: AsyncSession,
+    limit: int = 8,
+    document_ids: list[str] | None = None,
+) -> list[dict]:
+    """Combine vector and keyword search results with reciprocal rank fusion.
+
+    Results are cached per corpus version, so repeating a question against
+    an unchanged document set skips the embedding call and both searches.
+    """
+    if not settings.retrieval_cache_enabled:
+        return await _hybrid_search(query, db, limit, document_ids)
+
+    cache = get_retrieval_cache()
+    exact = None
+    if _search_mode() == "concurrent":
+        version = await corpus.current_version(db)
+    else:
+        # The version is read by the same statement that sets up the vector scan
+        exact, version = await _prepare_vector_scan(db, document_ids, limit * 2, read_version=True)
+    key = (normalize_query(query), tuple(sorted(str(d) for d in document_ids or ())), limit, version)
+    cached = cache.get(key)
+    if cached is not None:
+        results, cost = cached
+        metrics.incr("retrieval_cache.saved_seconds", cost)
+    else:
+        start = time.perf_counter()
+        results = await _hybrid_search(query, db, limit, document_ids, exact)
+        cache.put(key, (results, time.perf_counter() - start))
+    # Copies, so callers can't modify the cached entries
+    return [dict(r) for r in results]
+
+
+def _search_mode() -> str:
+    mode = settings.hybrid_search_mode
+    if mode == "sql" and numpy_index.enabled():
+        # The fused query needs the vectors in Postgres
+        return "concurrent"
+    return mode
+
+
+async def _hybrid_search(
+    query: str,
+    db: AsyncSession,
+    limit: int,
+    document_ids: list[str] | None,
+    exact: bool | None = None,
+) -> list[dict]:
+    mode = _search_mode()
+    with metrics.timed("retrieval.total"):
+        if mode == "concurrent":
+            return await _concurrent_search(query, db, limit, document_ids)
+
+        with metrics.timed("retrieval.embedding"):
+            query_embedding = await generate_embedding(query)
+
+        if mode == "sql":
+            with metrics.timed("retrieval.fused_query"):
+                return await fused_search(query, query_embedding, db, limit=limit, document_ids=document_ids, exact=exact)
+
+        with metrics.timed("retrieval.vector_query"):
+            vector_results = await vector_search(
+                query_embedding, db, limit=limit * 2, document_ids=document_ids, exact=exact
+            )
+        with metrics.timed("retrieval.keyword_branch"):
+            keyword_results = await keyword_search(query, db, limit=limit * 2, document_ids=document_ids)
+        return _rrf_fuse([vector_results, keyword_results], limit)
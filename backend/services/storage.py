@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+import os
+import zipfile
+import zlib
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+
+from fastapi import UploadFile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+class UnreadableMemberError(Exception):
+    """A ZIP member that cannot be extracted: encrypted, corrupt or unsupported compression."""
+
+
+@dataclass
+class StoredFile:
+    path: str
+    size: int
+    sha256: str
+
+
+async def iter_upload(file: UploadFile, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+async def save_stream(chunks: AsyncIterator[bytes], dest_path: str, max_bytes: int) -> StoredFile:
+    """Stream chunks to dest_path, hashing as it goes, with constant memory.
+
+    Data is written to a temp file next to dest_path and renamed into place only
+    once complete, so a partial upload is never visible. Raises
+    UploadTooLargeError as soon as max_bytes is exceeded.
+    """
+    tmp_path = f"{dest_path}.part"
+    digest = hashlib.sha256()
+    size = 0
+    f = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+            digest.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+        await asyncio.to_thread(f.close)
+        await asyncio.to_thread(os.replace, tmp_path, dest_path)
+    except BaseException:
+        f.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return StoredFile(path=dest_path, size=size, sha256=digest.hexdigest())
+
+
+async def _iter_zip_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    try:
+        # Encrypted members raise RuntimeError, unknown compression methods
+        # NotImplementedError, and corrupt data BadZipFile, zlib.error or EOFError
+        member = await asyncio.to_thread(archive.open, info)
+    except (RuntimeError, NotImplementedError, zipfile.BadZipFile) as e:
+        raise UnreadableMemberError(str(e)) from e
+    try:
+        while True:
+            try:
+                chunk = await asyncio.to_thread(member.read, chunk_size)
+            except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                raise UnreadableMemberError(str(e)) from e
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        member.close()
+
+
+async def iter_zip_members(file: UploadFile) -> AsyncIterator[tuple[str, AsyncIterator[bytes]]]:
+    """Yield (filename, chunk stream) for each file in an uploaded ZIP archive.
+
+    Members are decompressed lazily, so save_stream's size limit also guards
+    against archives that expand far beyond their upload size.
+    """
+    archive = await asyncio.to_thread(zipfile.ZipFile, file.file)
+    try:
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            yield name, _iter_zip_member(archive, info)
+    finally:
+        archive.close()
@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import math
+import re
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from config import settings
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "ix_document_chunks_embedding_ann"
+INDEX_TYPES = ("hnsw", "ivfflat")
+# Advisory lock serializing index builds and backfills across workers and instances
+BUILD_LOCK_KEY = 0x76656374
+
+# Per-query search breadth: larger values trade latency for recall
+PROFILES = {
+    "fast": {"ef_search": 40, "probes": 4},
+    "balanced": {"ef_search": 100, "probes": 10},
+    "accurate": {"ef_search": 250, "probes": 32},
+}
+
+_build_task: asyncio.Task | None = None
+_extension_version: tuple[int, ...] = ()  # installed pgvector, read at startup by detect_extension
+
+
+def _ivfflat_lists(rows: int) -> int:
+    # pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond
+    if settings.vector_index_ivfflat_lists:
+        return settings.vector_index_ivfflat_lists
+    return max(1, rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows)))
+
+
+def indexed_expression(quantization: str | None = None) -> tuple[str, str]:
+    """The indexed expression over dc.embedding and its operator class."""
+    quantization = quantization or settings.vector_quantization
+    dims = settings.embedding_dimensions
+    if quantization == "halfvec":
+        return f"(embedding::halfvec({dims}))", "halfvec_cosine_ops"
+    if quantization == "binary":
+        return f"(binary_quantize(embedding)::bit({dims}))", "bit_hamming_ops"
+    if quantization == "short":
+        return "embedding_short", "vector_cosine_ops"
+    if quantization == "none":
+        return "embedding", "vector_cosine_ops"
+    raise ValueError(f"Unsupported quantization: {quantization}")
+
+
+def index_definition(name: str, index_type: str, rows: int = 0, **params) -> str:
+    """CREATE INDEX statement for an ANN index on document_chunks.embedding."""
+    if index_type == "hnsw":
+        m = params.get("m") or settings.vector_index_hnsw_m
+        ef_construction = params.get("ef_construction") or settings.vector_index_hnsw_ef_construction
+        options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    elif index_type == "ivfflat":
+        options = f"lists = {int(params.get('lists') or _ivfflat_lists(rows))}"
+    else:
+        raise ValueError(f"Unsupported index type: {index_type}")
+    expression, opclass = indexed_expression(params.get("quantization"))
+    return (
+        f"CREATE INDEX CONCURRENTLY {name} ON document_chunks "
+        f"USING {index_type} ({expression} {opclass}) WITH ({options})"
+    )
+
+
+def index_matches(definition: str, index_type: str, quantization: str | None = None) -> bool:
+    """Whether a pg_get_indexdef() definition indexes the configured type, expression and opclass."""
+    expression, opclass = indexed_expression(quantization)
+    # Plain columns print as written; the expression modes have an opclass of their own
+    indexed = opclass if expression.startswith("(") else f"({expression} {opclass}"
+    return f"USING {index_type} " in definition and indexed in definition
+
+
+def quantized_order_by(query_param: str = ":embedding") -> str | None:
+    """ORDER BY expression that walks the quantized index, or None without quantization."""
+    dims = settings.embedding_dimensions
+    query = f"CAST({query_param} AS vector)"
+    if settings.vector_quantization == "halfvec":
+        return f"dc.embedding::halfvec({dims}) <=> {query}::halfvec({dims})"
+    if settings.vector_quantization == "binary":
+        return f"binary_quantize(dc.embedding)::bit({dims}) <~> binary_quantize({query})::bit({dims})"
+    if settings.vector_quantization == "short":
+        return "dc.embedding_short <=> CAST(:embedding_short AS vector)"
+    return None
+
+
+async def _index_exists(conn, name: str) -> bool:
+    result = await conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name})
+    return result.scalar()
+
+
+async def _backfill_short_embeddings(conn, batch_size: int = 5000) -> None:
+    """Fill embedding_short for rows written before it existed, in small autocommitted batches."""
+    dims = settings.embedding_short_dimensions
+    total = 0
+    while True:
+        result = await conn.execute(text(f"""
+            UPDATE document_chunks SET embedding_short = l2_normalize(subvector(embedding, 1, {dims}))
+            WHERE id IN (
+                SELECT id FROM document_chunks
+                WHERE embedding_short IS NULL AND embedding IS NOT NULL
+                LIMIT {batch_size}
+            )
+        """))
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            break
+    if total:
+        logger.info("Backfilled embedding_short for %d chunks", total)
+
+
+@asynccontextmanager
+async def _maintenance_connection() -> AsyncIterator[AsyncConnection | None]:
+    """Autocommit connection holding the build lock, or None if another process holds it."""
+    # CONCURRENTLY cannot run inside a transaction block
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": BUILD_LOCK_KEY}):
+            logger.info("Another process is maintaining the vector index; skipping")
+            yield None
+            return
+        try:
+            yield conn
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": BUILD_LOCK_KEY})
+
+
+async def _build(index_type: str | None, **params) -> None:
+    """Build the new index next to the old one and swap them, so search never goes unindexed."""
+    async with _maintenance_connection() as conn:
+        if conn is None:
+            return
+        # Session-level: SET LOCAL would end with the first autocommitted statement.
+        # Reset before the connection goes back to the pool.
+        await conn.execute(text(f"SET maintenance_work_mem = '{settings.vector_index_maintenance_work_mem}'"))
+        await conn.execute(text(f"SET max_parallel_maintenance_workers = {int(settings.vector_index_build_workers)}"))
+        try:
+            await _swap_index(conn, index_type, **params)
+        finally:
+            await conn.execute(text("RESET maintenance_work_mem"))
+            await conn.execute(text("RESET max_parallel_maintenance_workers"))
+
+
+async def _swap_index(conn: AsyncConnection, index_type: str | None, **params) -> None:
+    if not index_type:
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}"))
+        return
+
+    if (params.get("quantization") or settings.vector_quantization) == "short":
+        await _backfill_short_embeddings(conn)
+
+    # Leftovers of an interrupted build or swap; a failed concurrent build leaves an invalid index
+    await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}_new"))
+    await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}_old"))
+    rows = (await conn.execute(text("SELECT count(*) FROM document_chunks"))).scalar()
+    logger.info("Building %s index over %d chunks", index_type, rows)
+    await conn.execute(text(index_definition(f"{INDEX_NAME}_new", index_type, rows, **params)))
+
+    # The old index stays usable until the new one has taken its name
+    await conn.execute(text(f"ALTER INDEX IF EXISTS {INDEX_NAME} RENAME TO {INDEX_NAME}_old"))
+    await conn.execute(text(f"ALTER INDEX {INDEX_NAME}_new RENAME TO {INDEX_NAME}"))
+    await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}_old"))
+    logger.info("Vector index %s ready", INDEX_NAME)
+
+
+async def _backfill() -> None:
+    async with _maintenance_connection() as conn:
+        if conn is not None:
+            await _backfill_short_embeddings(conn)
+
+
+async def ensure_index() -> None:
+    """Start building the configured ANN index in the background if it does not exist yet.
+
+    In short mode, chunks stored before embedding_short existed are
+    backfilled in the background; search scores them exactly meanwhile.
+    """
+    index_type = settings.vector_index_type
+    if index_type == "none":
+        return
+    async with engine.connect() as conn:
+        exists = await _index_exists(conn, INDEX_NAME)
+        if exists:
+            definition = await conn.scalar(text("SELECT pg_get_indexdef(to_regclass(:name))"), {"name": INDEX_NAME})
+            if not index_matches(definition, index_type):
+                # Rebuilding a large index at startup would block it; leave that to the admin endpoint
+                logger.warning(
+                    "Vector index does not match vector_index_type/vector_quantization; "
+                    "searches will not use it until POST /api/admin/vector-index/rebuild"
+                )
+        missing_short = settings.vector_quantization == "short" and await conn.scalar(text(
+            "SELECT EXISTS (SELECT 1 FROM document_chunks WHERE embedding_short IS NULL AND embedding IS NOT NULL)"
+        ))
+    if not exists:
+        # Building over an existing corpus can take hours; search falls back
+        # to exact scans meanwhile
+        start_rebuild(index_type)
+    elif missing_short:
+        _start(_backfill, "embedding_short backfill")
+
+
+def build_in_progress() -> bool:
+    return _build_task is not None and not _build_task.done()
+
+
+def _start(job: Callable[[], Awaitable[None]], description: str) -> None:
+    global _build_task
+    if build_in_progress():
+        raise RuntimeError("A vector index build is already running")
+
+    async def run():
+        try:
+            await job()
+        except Exception:
+            logger.exception("%s failed", description)
+
+    _build_task = asyncio.create_task(run())
+
+
+def start_rebuild(index_type: str | None, **params) -> None:
+    """Rebuild (or, with index_type None, drop) the ANN index in the background."""
+    if index_type is not None and index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type: {index_type}")
+    _start(lambda: _build(index_type, **params), "Vector index build")
+
+
+async def detect_extension() -> None:
+    """Read the installed pgvector version, which decides the search settings that exist."""
+    global _extension_version
+    async with engine.connect() as conn:
+        version = await conn.scalar(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'"))
+    _extension_version = tuple(int(part) for part in re.findall(r"\d+", version or ""))
+    if settings.vector_iterative_scan and not iterative_scan_supported():
+        logger.warning("pgvector %s predates iterative index scans (0.8); filtered searches run without them", version)
+
+
+def iterative_scan_supported() -> bool:
+    # Older versions reject hnsw.iterative_scan, failing the whole query
+    return _extension_version >= (0, 8)
+
+
+def search_params_sql(limit: int, profile: str | None = None, iterative: bool = False) -> tuple[list[str], dict]:
+    """set_config calls for ef_search / probes, as SELECT-list items and their params.
+
+    They last for the rest of the session's current transaction, so callers
+    can fold them into a statement they run anyway. `iterative` enables
+    pgvector's iterative index scans (0.8+), so filtered queries keep
+    scanning until `limit` rows pass the filter. Result order is relaxed,
+    so callers re-sort by distance.
+    """
+    params = PROFILES[profile or settings.vector_search_profile]
+    columns = ["set_config('hnsw.ef_search', :ef_search, true)", "set_config('ivfflat.probes', :probes, true)"]
+    if iterative and settings.vector_iterative_scan and iterative_scan_supported():
+        columns += [
+            "set_config('hnsw.iterative_scan', 'relaxed_order', true)",
+            "set_config('ivfflat.iterative_scan', 'relaxed_order', true)",
+        ]
+    # HNSW returns at most ef_search rows, so never go below the requested limit
+    return columns, {"ef_search": str(max(params["ef_search"], limit)), "probes": str(params["probes"])}
+
+
+async def apply_search_params(db: AsyncSession, limit: int, profile: str | None = None, iterative: bool = False) -> None:
+    """Set ef_search / probes for the rest of the session's current transaction."""
+    columns, params = search_params_sql(limit, profile, iterative)
+    await db.execute(text(f"SELECT {', '.join(columns)}"), params)
+
+
+async def index_status() -> dict:
+    """Report the ANN index definition, size and validity, plus any build in progress."""
+    async with engine.connect() as conn:
+        index = (await conn.execute(text("""
+            SELECT pg_get_indexdef(i.indexrelid) AS definition,
+                   i.indisvalid AS valid,
+                   pg_relation_size(i.indexrelid) AS size_bytes
+            FROM pg_index i
+            WHERE i.indexrelid = to_regclass(:name)
+        """), {"name": INDEX_NAME})).mappings().first()
+
+        table = (await conn.execute(text("""
+            SELECT reltuples::bigint AS estimated_rows,
+                   pg_relation_size(oid) AS size_bytes
+            FROM pg_class WHERE oid = 'document_chunks'::regclass
+        """))).mappings().first()
+
+        progress = (await conn.execute(text("""
+            SELECT phase, blocks_done, blocks_total, tuples_done, tuples_total
+            FROM pg_stat_progress_create_index
+            WHERE relid = 'document_chunks'::regclass
+        """))).mappings().first()
+
+    return {
+        "name": INDEX_NAME,
+        "configured_type": settings.vector_index_type,
+        "quantization": settings.vector_quantization,
+        "search_profile": settings.vector_search_profile,
+        "index": dict(index) if index else None,
+        "table": dict(table),
+        "build": {
+            "running": build_in_progress() or progress is not None,
+            "progress": dict(progress) if progress else None,
+        },
+    }
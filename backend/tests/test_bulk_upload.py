@@ -0,0 +1,134 @@
+import io
+import zipfile
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from config import settings
+from database import get_db
+from main import app
+from models import IngestionJob
+from routers import documents
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class FakeSession:
+    def __init__(self):
+        self.added = []
+        self.committed = False
+        self.info = {}
+
+    def add(self, obj) -> None:
+        self.added.append(obj)
+
+    async def flush(self) -> None:
+        # Column defaults the database would apply on INSERT
+        for obj in self.added:
+            if isinstance(obj, IngestionJob) and obj.status is None:
+                obj.status = "queued"
+
+    async def commit(self) -> None:
+        self.committed = True
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    calls = []
+
+    async def find_duplicate(db, content_hash):
+        return None
+
+    async def enqueue(job_ids):
+        calls.append(job_ids)
+
+    monkeypatch.setattr(documents, "find_duplicate", find_duplicate)
+    monkeypatch.setattr(documents, "enqueue", enqueue)
+    return calls
+
+
+@pytest.fixture
+def session():
+    db = FakeSession()
+
+    async def get_fake_db():
+        yield db
+
+    app.dependency_overrides[get_db] = get_fake_db
+    yield db
+    app.dependency_overrides.pop(get_db, None)
+
+
+async def _post(files):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        return await client.post("/api/documents/bulk", files=files)
+
+
+def _zip_with_locked_member() -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        archive.writestr("a.pdf", b"%PDF a")
+        archive.writestr("notes.txt", b"text")
+        archive.writestr("locked.pdf", b"%PDF secret")
+    data = bytearray(buf.getvalue())
+    # Flag locked.pdf as encrypted in its local header and central directory entry
+    for signature, flags_offset, name_offset in ((b"PK\x03\x04", 6, 30), (b"PK\x01\x02", 8, 46)):
+        pos = data.find(signature)
+        while data[pos + name_offset:pos + name_offset + 10] != b"locked.pdf":
+            pos = data.find(signature, pos + 1)
+        data[pos + flags_offset] |= 0x1
+    return bytes(data)
+
+
+@pytest.mark.anyio
+async def test_bulk_upload_reports_each_file(upload_dir, enqueued, session):
+    resp = await _post([
+        ("files", ("room.zip", _zip_with_locked_member(), "application/zip")),
+        ("files", ("b.docx", b"docx", "application/octet-stream")),
+    ])
+
+    assert resp.status_code == 202
+    body = resp.json()
+    statuses = {f["filename"]: (f["status"], f["error"]) for f in body["files"]}
+    assert statuses["a.pdf"] == ("queued", None)
+    assert statuses["b.docx"] == ("queued", None)
+    assert statuses["notes.txt"][0] == "rejected"
+    assert statuses["locked.pdf"][0] == "rejected"
+    assert "Cannot extract" in statuses["locked.pdf"][1]
+    assert (body["accepted"], body["rejected"]) == (2, 2)
+    assert session.committed
+    assert len(enqueued) == 1 and len(enqueued[0]) == 2
+    assert len(list(upload_dir.iterdir())) == 2
+
+
+@pytest.mark.anyio
+async def test_bulk_upload_accepts_more_than_starlette_default_files(upload_dir, enqueued, session, monkeypatch):
+    monkeypatch.setattr(settings, "bulk_max_files", 1100)
+    resp = await _post([("files", (f"{i}.pdf", b"%PDF", "application/pdf")) for i in range(1001)])
+
+    assert resp.status_code == 202
+    assert resp.json()["accepted"] == 1001
+
+
+@pytest.mark.anyio
+async def test_aborted_bulk_upload_removes_saved_files(upload_dir, enqueued, session, monkeypatch):
+    async def failing_commit():
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(session, "commit", failing_commit)
+    with pytest.raises(RuntimeError):
+        await _post([
+            ("files", ("a.pdf", b"%PDF a", "application/pdf")),
+            ("files", ("b.pdf", b"%PDF b", "application/pdf")),
+        ])
+
+    assert list(upload_dir.iterdir()) == []
@@ -0,0 +1,39 @@
+import numpy as np
+
+from services import metrics
+from services.cache import ArrayCache
+
+
+def _vector(value: float, dims: int = 256) -> np.ndarray:
+    return np.full(dims, value, dtype=np.float32)
+
+
+def test_hit_and_miss_are_counted():
+    cache = ArrayCache("test_cache_counts", max_bytes=1 << 20, ttl_seconds=60)
+    assert cache.get("q") is None
+    cache.put("q", _vector(1.0))
+    assert cache.get("q")[0] == 1.0
+    assert metrics.get("test_cache_counts.hits") == 1
+    assert metrics.get("test_cache_counts.misses") == 1
+
+
+def test_evicts_least_recently_used_by_bytes():
+    # Room for two 1 KiB vectors
+    cache = ArrayCache("test_cache_lru", max_bytes=2 * 1024 + 200, ttl_seconds=60)
+    cache.put("a", _vector(1.0))
+    cache.put("b", _vector(2.0))
+    cache.get("a")
+    cache.put("c", _vector(3.0))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.size_bytes <= cache.max_bytes
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    cache = ArrayCache("test_cache_ttl", max_bytes=1 << 20, ttl_seconds=10)
+    now = [1000.0]
+    monkeypatch.setattr("services.cache.time.monotonic", lambda: now[0])
+    cache.put("q", _vector(1.0))
+    now[0] += 11
+    assert cache.get("q") is None
+    assert len(cache) == 0 and cache.size_bytes == 0
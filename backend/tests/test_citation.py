@@ -17,6 +17,7 @@ class TestCitation:
         assert d["filename"] == "contract.pdf"
         assert d["page_number"] == 5
         assert d["section"] == "Section 2.1"
+        assert d["chunk_ids"] == ["chunk-456"]
 
     def test_format_for_llm_full(self):
         c = Citation(
@@ -0,0 +1,88 @@
+from services.citation import build_citations
+from services.context_packer import _overlap_length, pack_context
+
+OVERLAP = "the indemnifying party shall defend"
+
+
+def _chunk(chunk_id, document_id, index, content, tokens, page=None, score=1.0, section="Section 9"):
+    return {
+        "chunk_id": chunk_id,
+        "document_id": document_id,
+        "filename": f"{document_id}.pdf",
+        "content": content,
+        "page_number": page,
+        "section": section,
+        "chunk_index": index,
+        "token_count": tokens,
+        "score": score,
+    }
+
+
+class TestOverlapLength:
+    def test_finds_repeated_tail(self):
+        assert _overlap_length(f"Clause 9.1 says {OVERLAP}", f"{OVERLAP} and hold harmless") == len(OVERLAP)
+
+    def test_ignores_short_coincidences(self):
+        assert _overlap_length("ends with the", "the next chunk") == 0
+
+
+class TestPackContext:
+    def test_merges_adjacent_chunks_and_drops_overlap(self, monkeypatch):
+        monkeypatch.setattr("services.context_packer.settings.chunk_overlap_tokens", 5)
+        chunks = [
+            _chunk("b", "doc1", 4, f"{OVERLAP} and hold harmless.", 10, page=4, score=0.9),
+            _chunk("x", "doc2", 0, "Unrelated excerpt.", 3, score=0.8),
+            _chunk("a", "doc1", 3, f"Clause 9.1 says {OVERLAP}", 8, page=3, score=0.7),
+        ]
+        packed = pack_context(chunks, max_tokens=100)
+
+        assert [p["chunk_ids"] for p in packed] == [["a", "b"], ["x"]]
+        merged = packed[0]
+        assert merged["content"] == f"Clause 9.1 says {OVERLAP} and hold harmless."
+        assert merged["token_count"] == 13
+        assert (merged["page_number"], merged["page_end"]) == (3, 4)
+        assert merged["score"] == 0.9
+
+    def test_merged_entry_names_every_section(self):
+        chunks = [
+            _chunk("a", "doc1", 0, "End of nine.", 3, section="Section 9"),
+            _chunk("b", "doc1", 1, "More of nine.", 3, section="Section 9"),
+            _chunk("c", "doc1", 2, "Start of ten.", 3, section="Section 10"),
+            _chunk("d", "doc2", 0, "Untitled.", 2, section=None),
+        ]
+        packed = pack_context(chunks, max_tokens=100)
+        assert [p["section"] for p in packed] == ["Section 9 / Section 10", None]
+
+        citation = build_citations(packed)[0].to_dict()
+        assert citation["chunk_id"] == "a"
+        assert citation["chunk_ids"] == ["a", "b", "c"]
+
+    def test_non_adjacent_chunks_stay_separate(self):
+        chunks = [
+            _chunk("a", "doc1", 1, "First clause text.", 4),
+            _chunk("b", "doc1", 3, "Third clause text.", 4),
+        ]
+        assert [p["chunk_ids"] for p in pack_context(chunks, max_tokens=100)] == [["a"], ["b"]]
+
+    def test_budget_skips_what_does_not_fit(self):
+        chunks = [
+            _chunk("a", "doc1", 0, "Top excerpt.", 60),
+            _chunk("b", "doc2", 0, "Too long.", 50),
+            _chunk("c", "doc3", 0, "Short.", 30),
+        ]
+        assert [p["chunk_id"] for p in pack_context(chunks, max_tokens=100)] == ["a", "c"]
+
+    def test_top_result_kept_over_budget(self):
+        chunks = [_chunk("a", "doc1", 0, "Very long excerpt.", 500)]
+        assert len(pack_context(chunks, max_tokens=100)) == 1
+
+    def test_citations_number_packed_entries(self):
+        chunks = [
+            _chunk("a", "doc1", 0, "One.", 2, page=1),
+            _chunk("b", "doc1", 1, "Two.", 2, page=2),
+            _chunk("c", "doc2", 0, "Three.", 2, page=7),
+        ]
+        citations = build_citations(pack_context(chunks, max_tokens=100))
+        assert [c.number for c in citations] == [1, 2]
+        assert "pages 1-2" in citations[0].format_for_llm()
+        assert "page 7" in citations[1].format_for_llm()
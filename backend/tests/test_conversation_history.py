@@ -0,0 +1,48 @@
+from models import Message
+from services.conversation_history import fold_point, recent_messages
+
+
+def _conversation(*tokens: int) -> list[Message]:
+    return [
+        Message(role="user" if i % 2 == 0 else "assistant", content=f"message {i}", token_count=n)
+        for i, n in enumerate(tokens)
+    ]
+
+
+class TestRecentMessages:
+    def test_keeps_everything_under_budget(self):
+        messages = _conversation(10, 100, 10, 100)
+        assert recent_messages(messages, 0, 1000) == messages
+
+    def test_skips_summarized_messages(self):
+        messages = _conversation(10, 100, 10, 100)
+        assert recent_messages(messages, 2, 1000) == messages[2:]
+
+    def test_cuts_to_budget_on_a_turn_boundary(self):
+        messages = _conversation(10, 100, 10, 100, 10, 100)
+        # 210 tokens reach back to the assistant reply at index 3; the
+        # history starts at the next user message instead
+        assert recent_messages(messages, 0, 210) == messages[4:]
+
+    def test_counts_tokens_when_not_stored(self):
+        messages = [Message(role="user", content="one two three", token_count=None)]
+        assert recent_messages(messages, 0, 2) == []
+        assert recent_messages(messages, 0, 3) == messages
+
+
+class TestFoldPoint:
+    def test_nothing_to_fold_under_budget(self):
+        assert fold_point(_conversation(10, 100, 10, 100), 0, 500) == 0
+
+    def test_folds_whole_turns_down_to_half_budget(self):
+        messages = _conversation(10, 300, 10, 300, 10, 300)
+        # 930 tokens against a 600 budget: folding stops mid-turn at 300
+        # remaining and backs up to the start of that turn
+        end = fold_point(messages, 0, 600)
+        assert end == 4
+        assert messages[end].role == "user"
+
+    def test_starts_from_existing_summary(self):
+        messages = _conversation(10, 300, 10, 300, 10, 300)
+        assert fold_point(messages, 2, 700) == 2
+        assert fold_point(messages, 2, 600) == 4
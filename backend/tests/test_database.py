@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from database import BinaryVector
+
+
+def test_binary_vector_binds_float32_arrays():
+    process = BinaryVector(3).bind_processor(postgresql.dialect())
+    value = process([1, 2, 3])
+    assert isinstance(value, np.ndarray) and value.dtype == np.float32
+    assert process(None) is None
+
+
+def test_binary_vector_checks_dimensions():
+    process = BinaryVector(3).bind_processor(postgresql.dialect())
+    with pytest.raises(ValueError):
+        process([1.0, 2.0])
@@ -3,14 +3,21 @@ import tempfile
 
 import pytest
 
+from services import document_processor
 from services.document_processor import (
+    ChunkBuilder,
     TextChunk,
     _detect_section_header,
     _get_overlap,
     chunk_text,
+    iter_chunks,
+    iter_segments,
     parse_and_chunk,
     parse_pdf,
+    parse_pdf_range,
+    split_segments,
 )
+from utils import encode_batch
 
 
 class TestSectionHeaderDetection:
@@ -34,19 +41,41 @@ class TestSectionHeaderDetection:
 
 class TestGetOverlap:
     def test_short_text(self):
-        result = _get_overlap("hello world", 100)
-        assert result == "hello world"
+        parts = [("hello world", encode_batch(["hello world"])[0])]
+        assert _get_overlap(parts, 100) == parts
 
     def test_overlap_extraction(self):
         text = " ".join(f"word{i}" for i in range(100))
-        result = _get_overlap(text, 50)
-        words = result.split()
-        # Should get ~37 words (50 * 0.75)
-        assert len(words) == 37
+        parts = [("Heading", encode_batch(["Heading"])[0]), (text, encode_batch([text])[0])]
+        result = _get_overlap(parts, 50)
+        assert len(result) == 1
+        assert len(result[0][1]) == 50
+        assert text.endswith(result[0][0])
+
+    def test_keeps_whole_trailing_paragraphs(self):
+        texts = ["First paragraph of the clause.", "Second.", "Third."]
+        parts = list(zip(texts, encode_batch(texts)))
+        overlap = len(parts[1][1]) + len(parts[2][1])
+        assert _get_overlap(parts, overlap) == parts[1:]
+
+    def test_cut_moves_to_a_word_boundary(self, monkeypatch):
+        # Byte-level tokens, so a cut can split a word or a multi-byte character
+        monkeypatch.setattr(document_processor, "decode", lambda ids: bytes(ids).decode(errors="replace"))
+        text = "prix du café crème"
+        tokens = list(text.encode())
+        # The last 8 bytes start with the second byte of "é" in café
+        text_tail, token_tail = _get_overlap([(text, tokens)], 8)[0]
+        assert text_tail == "crème"
+        assert token_tail == list(" crème".encode())
+
+    def test_paragraph_without_a_boundary_is_dropped(self, monkeypatch):
+        monkeypatch.setattr(document_processor, "decode", lambda ids: bytes(ids).decode(errors="replace"))
+        parts = [("indemnification", list(b"indemnification")), ("Yes.", list(b"Yes."))]
+        assert _get_overlap(parts, 8) == parts[1:]
 
     def test_zero_overlap(self):
-        result = _get_overlap("hello world", 0)
-        assert result == ""
+        parts = [("hello world", encode_batch(["hello world"])[0])]
+        assert _get_overlap(parts, 0) == []
 
 
 class TestChunkText:
@@ -67,6 +96,15 @@ class TestChunkText:
             assert len(chunk.content) > 0
             assert chunk.token_count > 0
 
+    def test_overlap_is_exact_tokens(self):
+        long_text = "\n\n".join([f"Paragraph {i}. " + "word " * 100 for i in range(20)])
+        pages = [{"text": long_text, "page_number": 1}]
+        chunks = chunk_text(pages, target_tokens=250, overlap_tokens=10)
+        for prev, nxt in zip(chunks, chunks[1:]):
+            head = nxt.content.split("\n\n")[0]
+            assert prev.content.endswith(head)
+            assert 0 < len(head.split()) <= 10
+
     def test_preserves_page_numbers(self):
         pages = [
             {"text": "Page one content", "page_number": 1},
@@ -83,6 +121,23 @@ class TestChunkText:
         assert "Indemnification" in chunks[0].section
 
 
+class TestParsePdfRange:
+    def test_keeps_absolute_page_numbers(self):
+        import fitz
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "doc.pdf")
+            pdf = fitz.open()
+            for n in range(1, 6):
+                pdf.new_page().insert_text((72, 72), f"Page {n} text")
+            pdf.save(path)
+            pdf.close()
+
+            pages = parse_pdf_range(path, 2, 4)
+            assert [p["page_number"] for p in pages] == [3, 4]
+            assert parse_pdf_range(path, 0, None) == parse_pdf(path)
+
+
 class TestParseAndChunk:
     def test_unsupported_type(self):
         with pytest.raises(ValueError, match="Unsupported file type"):
@@ -91,3 +146,42 @@ class TestParseAndChunk:
     def test_pdf_nonexistent_file(self):
         with pytest.raises(Exception):
             parse_and_chunk("/tmp/nonexistent.pdf", "pdf")
+
+
+class TestStreaming:
+    def test_chunks_are_built_as_expected(self, monkeypatch):
+        # A word-per-token vocabulary, so the expected chunks don't depend on the real tokenizer
+        vocab: list[str] = []
+
+        def encode(texts):
+            for word in (w for t in texts for w in t.split() if w not in vocab):
+                vocab.append(word)
+            return [[vocab.index(w) for w in t.split()] for t in texts]
+
+        monkeypatch.setattr(document_processor, "encode_batch", encode)
+        monkeypatch.setattr(document_processor, "decode", lambda ids: " ".join(vocab[i] for i in ids))
+        pages = [
+            {"text": "Section 1.2 Definitions\n\none two three four\n\nfive six seven eight nine", "page_number": 1},
+            {"text": "ten eleven twelve", "page_number": 2},
+        ]
+        section = "Section 1.2 Definitions"
+        expected = [
+            TextChunk("Section 1.2 Definitions\n\none two three four", 1, section, 7),
+            # Each later chunk opens with the previous one's last three tokens
+            TextChunk("two three four\n\nfive six seven eight nine", 1, section, 8),
+            TextChunk("seven eight nine\n\nten eleven twelve", 2, section, 6),
+        ]
+
+        assert chunk_text(pages, target_tokens=8, overlap_tokens=3) == expected
+        streamed = iter_chunks(iter_segments(iter(pages)), target_tokens=8, overlap_tokens=3)
+        assert list(streamed) == expected
+
+    def test_chunk_builder_closes_one_chunk_at_a_time(self):
+        builder = ChunkBuilder(target_tokens=5, overlap_tokens=1)
+        closed = [builder.feed(seg) for seg in split_segments([{"text": "one two three\n\nfour five six", "page_number": 3}])]
+        assert closed[0] is None
+        assert closed[1].content == "one two three"
+        assert closed[1].page_number == 3
+        final = builder.finish()
+        assert final.content.endswith("four five six")
+        assert builder.finish() is None
@@ -0,0 +1,55 @@
+import uuid
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from database import get_db
+from main import app
+from models import Document
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class FakeSession:
+    def __init__(self, doc: Document):
+        self.doc = doc
+        self.deleted = []
+
+    async def execute(self, statement):
+        doc = self.doc
+
+        class Result:
+            def scalar_one_or_none(self):
+                return doc
+
+        return Result()
+
+    async def delete(self, obj) -> None:
+        self.deleted.append(obj)
+
+
+@pytest.fixture
+def session():
+    db = FakeSession(Document(
+        id=uuid.uuid4(), filename="a.pdf", file_type="pdf", file_path="/nonexistent/a.pdf",
+        file_size=1, status="processing",
+    ))
+
+    async def get_fake_db():
+        yield db
+
+    app.dependency_overrides[get_db] = get_fake_db
+    yield db
+    app.dependency_overrides.pop(get_db, None)
+
+
+@pytest.mark.anyio
+async def test_delete_refuses_document_being_ingested(session):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        resp = await client.delete(f"/api/documents/{session.doc.id}")
+
+    assert resp.status_code == 409
+    assert session.deleted == []
@@ -0,0 +1,192 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from config import settings
+from services import embedding, embedding_cache
+from services.document_processor import TextChunk
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    calls: list[list[str]] = []
+
+    async def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    monkeypatch.setattr(embedding, "_embed_uncached", embed)
+    return calls
+
+
+@pytest.fixture
+def fake_cache(monkeypatch):
+    store: dict[str, list[float]] = {}
+
+    async def lookup(hashes):
+        return {h: store[h] for h in hashes if h in store}
+
+    async def save(vectors):
+        store.update(vectors)
+
+    monkeypatch.setattr(embedding_cache, "lookup", lookup)
+    monkeypatch.setattr(embedding_cache, "store", save)
+    return store
+
+
+class TestGenerateEmbeddingsCache:
+    @pytest.mark.anyio
+    async def test_only_misses_are_embedded(self, fake_api, fake_cache):
+        fake_cache[embedding_cache.text_hash("cached")] = [42.0]
+        result = await embedding.generate_embeddings(["cached", "new text"])
+        assert result == [[42.0], [8.0]]
+        assert fake_api == [["new text"]]
+        assert embedding_cache.text_hash("new text") in fake_cache
+
+    @pytest.mark.anyio
+    async def test_repeated_texts_embedded_once(self, fake_api, fake_cache):
+        result = await embedding.generate_embeddings(["clause", "clause", "other"])
+        assert result == [[6.0], [6.0], [5.0]]
+        assert fake_api == [["clause", "other"]]
+
+    @pytest.mark.anyio
+    async def test_full_hit_makes_no_api_call(self, fake_api, fake_cache):
+        await embedding.generate_embeddings(["a", "b"])
+        fake_api.clear()
+        await embedding.generate_embeddings(["b", "a"])
+        assert fake_api == []
+
+
+def _chunk(text: str, tokens: int) -> TextChunk:
+    return TextChunk(content=text, page_number=None, section=None, token_count=tokens)
+
+
+class TestPackBatches:
+    def test_respects_token_limit(self, monkeypatch):
+        monkeypatch.setattr(settings, "embedding_max_batch_tokens", 100)
+        batches = list(embedding.pack_batches([40, 40, 40, 90, 10], lambda n: n))
+        assert batches == [[40, 40], [40], [90, 10]]
+
+    def test_respects_input_limit(self, monkeypatch):
+        monkeypatch.setattr(settings, "embedding_max_batch_inputs", 2)
+        batches = list(embedding.pack_batches([1, 1, 1, 1, 1], lambda n: n))
+        assert batches == [[1, 1], [1, 1], [1]]
+
+    def test_oversized_item_gets_own_batch(self, monkeypatch):
+        monkeypatch.setattr(settings, "embedding_max_batch_tokens", 100)
+        assert list(embedding.pack_batches([500, 1], lambda n: n)) == [[500], [1]]
+
+
+class TestIterEmbeddedBatches:
+    @pytest.mark.anyio
+    async def test_yields_batches_in_order(self, monkeypatch, fake_api, fake_cache):
+        monkeypatch.setattr(settings, "embedding_max_batch_inputs", 2)
+        chunks = [_chunk("x" * n, 1) for n in range(1, 8)]
+        seen = []
+        async for batch, vectors in embedding.iter_embedded_batches(chunks):
+            assert [[float(len(c.content))] for c in batch] == vectors
+            seen.extend(batch)
+        assert seen == chunks
+        assert len(fake_api) == 4
+
+
+class TestRetry:
+    @pytest.mark.anyio
+    async def test_retries_rate_limit_then_succeeds(self, monkeypatch):
+        monkeypatch.setattr(settings, "embedding_retry_base_delay", 0)
+        attempts = []
+
+        async def flaky(texts):
+            attempts.append(texts)
+            if len(attempts) < 3:
+                request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+                raise openai.RateLimitError("slow down", response=httpx.Response(429, request=request), body=None)
+            return [[1.0] for _ in texts]
+
+        monkeypatch.setattr(embedding, "_embed_uncached", flaky)
+        assert await embedding.generate_embeddings(["a"], use_cache=False) == [[1.0]]
+        assert len(attempts) == 3
+
+    @pytest.mark.anyio
+    async def test_does_not_retry_client_errors(self, monkeypatch):
+        attempts = []
+
+        async def bad_request(texts):
+            attempts.append(texts)
+            request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+            raise openai.BadRequestError("bad", response=httpx.Response(400, request=request), body=None)
+
+        monkeypatch.setattr(embedding, "_embed_uncached", bad_request)
+        with pytest.raises(openai.BadRequestError):
+            await embedding.generate_embeddings(["a"], use_cache=False)
+        assert len(attempts) == 1
+
+
+class TestQueryEmbeddingCache:
+    @pytest.mark.anyio
+    async def test_repeated_query_is_served_from_cache(self, monkeypatch, fake_api):
+        monkeypatch.setattr(embedding, "_query_cache", None)
+        first = await embedding.generate_embedding("What is the governing law?")
+        second = await embedding.generate_embedding("  what is the  GOVERNING law? ")
+        assert first == second == [26.0]
+        assert len(fake_api) == 1
+
+
+class TestEmbeddingBatcher:
+    @pytest.mark.anyio
+    async def test_concurrent_queries_share_one_request(self, fake_api):
+        batcher = embedding.EmbeddingBatcher(window=0.01, max_size=64)
+        vectors = await asyncio.gather(*[batcher.embed(t) for t in ["a", "bb", "ccc", "bb"]])
+        assert vectors == [[1.0], [2.0], [3.0], [2.0]]
+        assert fake_api == [["a", "bb", "ccc"]]
+
+    @pytest.mark.anyio
+    async def test_full_batch_is_sent_without_waiting(self, fake_api):
+        batcher = embedding.EmbeddingBatcher(window=10, max_size=2)
+        vectors = await asyncio.wait_for(asyncio.gather(batcher.embed("a"), batcher.embed("bb")), timeout=1)
+        assert vectors == [[1.0], [2.0]]
+        assert fake_api == [["a", "bb"]]
+
+    @pytest.mark.anyio
+    async def test_errors_reach_every_caller(self, monkeypatch):
+        async def fail(texts):
+            request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+            raise openai.BadRequestError("bad", response=httpx.Response(400, request=request), body=None)
+
+        monkeypatch.setattr(embedding, "_embed_uncached", fail)
+        batcher = embedding.EmbeddingBatcher(window=0.01, max_size=64)
+        results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+        assert all(isinstance(r, openai.BadRequestError) for r in results)
+
+    @pytest.mark.anyio
+    async def test_bad_text_does_not_fail_its_batch(self, monkeypatch):
+        calls = []
+
+        async def reject_empty(texts):
+            calls.append(list(texts))
+            if "" in texts:
+                request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+                raise openai.BadRequestError("bad", response=httpx.Response(400, request=request), body=None)
+            return [[float(len(t))] for t in texts]
+
+        monkeypatch.setattr(embedding, "_embed_uncached", reject_empty)
+        batcher = embedding.EmbeddingBatcher(window=0.01, max_size=64)
+        results = await asyncio.gather(
+            batcher.embed("a"), batcher.embed(""), batcher.embed("bb"), batcher.embed(""), return_exceptions=True
+        )
+        assert results[0] == [1.0] and results[2] == [2.0]
+        assert isinstance(results[1], openai.BadRequestError) and results[3] is results[1]
+        assert calls[0] == ["a", "", "bb"]
+        assert sorted(calls[1:]) == [[""], ["a"], ["bb"]]
+
+
+def test_shorten_embedding_truncates_and_renormalizes():
+    short = embedding.shorten_embedding([3.0, 4.0, 12.0], dimensions=2)
+    assert short.tolist() == pytest.approx([0.6, 0.8])
@@ -0,0 +1,352 @@
+import asyncio
+import uuid
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import openai
+import pytest
+from sqlalchemy.sql.dml import Delete, Update
+from sqlalchemy.sql.selectable import Select
+
+from config import settings
+from models import Document, DocumentChunk, IngestionJob
+from services import embedding, embedding_cache, ingestion
+from services.document_processor import TextChunk
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class FakeSession:
+    """Just enough of AsyncSession for run_jobs: get, the statements it issues, and chunk rows."""
+
+    def __init__(self):
+        self.objects: dict[uuid.UUID, object] = {}
+        self.chunks: dict[uuid.UUID, list[int]] = {}
+        self.expunged: list[object] = []
+        self.info: dict = {}
+        self.commits = 0
+
+    def expunge(self, obj) -> None:
+        self.expunged.append(obj)
+
+    def delete_document(self, document_id: uuid.UUID) -> None:
+        """What DELETE FROM documents cascades to."""
+        self.objects = {
+            key: obj for key, obj in self.objects.items()
+            if document_id not in (key, getattr(obj, "document_id", None))
+        }
+        self.chunks.pop(document_id, None)
+
+    def add(self, obj) -> None:
+        self.objects[obj.id] = obj
+
+    async def get(self, cls, key):
+        obj = self.objects.get(key)
+        return obj if isinstance(obj, cls) else None
+
+    async def execute(self, statement, params=None):
+        if isinstance(statement, Select):
+            # The documents still present, locked by _drop_vanished
+            ids = [i for i in statement.whereclause.right.value if isinstance(self.objects.get(i), Document)]
+
+            class Result:
+                def scalars(self):
+                    return iter(ids)
+
+            return Result()
+        if isinstance(statement, Delete) and statement.table.name == DocumentChunk.__tablename__:
+            ids = statement.whereclause.right.value
+            for document_id in ids if isinstance(ids, list) else [ids]:
+                self.chunks.pop(document_id, None)
+        elif isinstance(statement, Update):
+            target = self.objects[statement.whereclause.right.value]
+            for key, value in statement.compile().params.items():
+                if hasattr(target, key):
+                    setattr(target, key, value)
+
+    async def flush(self) -> None:
+        pass
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+    async def rollback(self) -> None:
+        pass
+
+
+class FakeWriter:
+    def __init__(self, db: FakeSession):
+        self.db = db
+
+    async def add(self, document_id, chunk_index, chunk, embedding):
+        self.db.chunks.setdefault(document_id, []).append(chunk_index)
+        return uuid.uuid4()
+
+    async def flush(self) -> None:
+        pass
+
+
+# Chunks per fake file; "broken" files fail after their first chunk
+FILES = {"a.pdf": 5, "b.pdf": 3, "broken.pdf": 4, "c.pdf": 2}
+
+
+async def _fake_chunks(file_path: str, file_type: str):
+    name = file_path.rsplit("/", 1)[-1]
+    for i in range(FILES[name]):
+        if name.startswith("broken") and i == 1:
+            raise ValueError("corrupt xref table")
+        yield TextChunk(content=f"{name} chunk {i}", page_number=i + 1, section=None, token_count=10)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    session = FakeSession()
+
+    @asynccontextmanager
+    async def async_session():
+        yield session
+
+    async def lookup(hashes):
+        return {}
+
+    async def store(vectors):
+        pass
+
+    monkeypatch.setattr(ingestion, "async_session", async_session)
+    monkeypatch.setattr(ingestion, "ChunkWriter", FakeWriter)
+    monkeypatch.setattr(ingestion, "aiter_chunks", _fake_chunks)
+    monkeypatch.setattr(embedding_cache, "lookup", lookup)
+    monkeypatch.setattr(embedding_cache, "store", store)
+    monkeypatch.setattr(settings, "embedding_max_batch_inputs", 4)
+    return session
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    calls: list[list[str]] = []
+
+    async def embed(texts):
+        calls.append(list(texts))
+        return [[1.0, 0.0] for _ in texts]
+
+    monkeypatch.setattr(embedding, "_embed_uncached", embed)
+    return calls
+
+
+def _add_jobs(db: FakeSession, *filenames: str) -> list[IngestionJob]:
+    jobs = []
+    for filename in filenames:
+        doc = Document(
+            id=uuid.uuid4(), filename=filename, file_type="pdf", file_path=f"/nonexistent/{filename}",
+            file_size=1, status="processing", page_count=None, chunk_count=0,
+        )
+        job = IngestionJob(
+            id=uuid.uuid4(), document_id=doc.id, status="queued", attempts=0,
+            pages_parsed=0, chunks_total=0, chunks_embedded=0, rows_written=0,
+        )
+        db.add(doc)
+        db.add(job)
+        jobs.append(job)
+    return jobs
+
+
+@pytest.mark.anyio
+async def test_documents_share_embedding_batches(db, api_calls):
+    jobs = _add_jobs(db, "a.pdf", "b.pdf", "c.pdf")
+    errors = await ingestion.run_jobs([job.id for job in jobs])
+
+    assert errors == {job.id: None for job in jobs}
+    for job, chunks in zip(jobs, (5, 3, 2)):
+        doc = db.objects[job.document_id]
+        assert (job.status, doc.status, doc.chunk_count) == ("completed", "ready", chunks)
+        assert sorted(db.chunks[doc.id]) == list(range(chunks))
+        assert doc.page_count == chunks
+    assert all(len(call) <= 4 for call in api_calls)
+    assert sum(len(call) for call in api_calls) == 10
+    # Ten chunks from three documents need only three requests of up to four
+    assert len(api_calls) == 3
+    assert any(len({text.split()[0] for text in call}) > 1 for call in api_calls)
+    assert not ingestion._owned
+
+
+@pytest.mark.anyio
+async def test_parse_failure_fails_only_its_document(db, api_calls):
+    jobs = _add_jobs(db, "a.pdf", "broken.pdf", "b.pdf")
+    errors = await ingestion.run_jobs([job.id for job in jobs])
+
+    good = [jobs[0], jobs[2]]
+    broken = jobs[1]
+    for job in good:
+        assert errors[job.id] is None
+        assert job.status == "completed"
+        assert db.objects[job.document_id].status == "ready"
+        assert db.chunks[job.document_id]
+    assert errors[broken.id].stage == "parsing"
+    assert "corrupt xref table" in str(errors[broken.id])
+    assert (broken.status, broken.stage) == ("failed", "parsing")
+    assert db.objects[broken.document_id].status == "failed"
+    assert broken.document_id not in db.chunks
+    # Its chunk queued before the failure is dropped, not embedded
+    assert not any(text.startswith("broken.pdf") for call in api_calls for text in call)
+
+
+@pytest.mark.anyio
+async def test_deleted_document_does_not_fail_its_batch(db, api_calls, monkeypatch):
+    jobs = _add_jobs(db, "a.pdf", "b.pdf", "c.pdf")
+    deleted = jobs[1]
+    flush = FakeWriter.flush
+    seen: dict[str, int] = {}
+
+    async def delete_after_first_batch(self):
+        await flush(self)
+        if not seen:
+            seen["chunks_embedded"] = deleted.chunks_embedded
+            self.db.delete_document(deleted.document_id)
+
+    monkeypatch.setattr(FakeWriter, "flush", delete_after_first_batch)
+    errors = await ingestion.run_jobs([job.id for job in jobs])
+
+    for job, chunks in ((jobs[0], 5), (jobs[2], 2)):
+        assert errors[job.id] is None
+        assert job.status == "completed"
+        assert sorted(db.chunks[job.document_id]) == list(range(chunks))
+    assert errors[deleted.id] is None
+    assert deleted.document_id not in db.chunks
+    assert deleted in db.expunged
+    # Its job row is gone; the ORM object must not pick up changes to flush
+    assert deleted.status == "running" and deleted.chunks_embedded == seen["chunks_embedded"]
+
+
+@pytest.mark.anyio
+async def test_embedding_failure_fails_every_unfinished_document(db, monkeypatch):
+    async def bad_request(texts):
+        request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+        raise openai.BadRequestError("bad", response=httpx.Response(400, request=request), body=None)
+
+    monkeypatch.setattr(embedding, "_embed_uncached", bad_request)
+    jobs = _add_jobs(db, "a.pdf", "b.pdf")
+    errors = await ingestion.run_jobs([job.id for job in jobs])
+
+    for job in jobs:
+        assert errors[job.id].stage == "embedding"
+        assert job.status == "failed"
+        assert job.document_id not in db.chunks
+
+
+@pytest.mark.anyio
+async def test_storage_failure_is_not_reported_as_embedding(db, api_calls, monkeypatch):
+    async def broken_flush(self):
+        raise RuntimeError("connection was closed in the middle of operation")
+
+    monkeypatch.setattr(FakeWriter, "flush", broken_flush)
+    jobs = _add_jobs(db, "a.pdf")
+    with pytest.raises(ingestion.IngestionError) as excinfo:
+        await ingestion.run_job(jobs[0].id)
+
+    assert excinfo.value.stage == "storage"
+    assert (jobs[0].status, jobs[0].stage) == ("failed", "storage")
+
+
+@pytest.mark.anyio
+async def test_finished_jobs_are_skipped(db, api_calls):
+    jobs = _add_jobs(db, "a.pdf")
+    jobs[0].status = "completed"
+    assert await ingestion.run_jobs([jobs[0].id]) == {}
+    assert api_calls == []
+
+
+def test_group_jobs_keeps_bulk_uploads_together():
+    single1, single2, a1, a2, b1 = (uuid.uuid4() for _ in range(5))
+    batch_a, batch_b = uuid.uuid4(), uuid.uuid4()
+    rows = [(a1, batch_a), (single1, None), (b1, batch_b), (a2, batch_a), (single2, None)]
+    assert ingestion.group_jobs(rows) == [[a1, a2], [single1], [b1], [single2]]
+
+
+Claimed = namedtuple("Claimed", "id batch_id created_at")
+
+
+class ClaimSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements: list[tuple[str, dict]] = []
+        self.committed = False
+
+    async def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        rows = self.rows
+
+        class Result:
+            def all(self):
+                return rows
+
+        return Result()
+
+    async def commit(self) -> None:
+        self.committed = True
+
+
+@pytest.mark.anyio
+async def test_claim_stale_jobs_requeues_in_creation_order(monkeypatch):
+    now = datetime.now(timezone.utc)
+    batch = uuid.uuid4()
+    old, bulk1, bulk2, new = (uuid.uuid4() for _ in range(4))
+    # RETURNING order is arbitrary
+    session = ClaimSession([
+        Claimed(new, None, now),
+        Claimed(bulk2, batch, now - timedelta(minutes=1)),
+        Claimed(old, None, now - timedelta(minutes=3)),
+        Claimed(bulk1, batch, now - timedelta(minutes=2)),
+    ])
+
+    @asynccontextmanager
+    async def async_session():
+        yield session
+
+    monkeypatch.setattr(ingestion, "async_session", async_session)
+    monkeypatch.setattr(ingestion, "_queue", asyncio.Queue())
+    monkeypatch.setattr(ingestion, "_owned", set())
+    monkeypatch.setattr(settings, "ingestion_heartbeat_seconds", 10)
+
+    assert await ingestion.claim_stale_jobs() == 4
+    queued = [ingestion._queue.get_nowait() for _ in range(ingestion._queue.qsize())]
+    assert queued == [[old], [bulk1, bulk2], [new]]
+    assert ingestion._owned == {old, bulk1, bulk2, new}
+    assert session.committed
+
+    sql, params = session.statements[0]
+    assert "FOR UPDATE SKIP LOCKED" in sql and "heartbeat_at = now()" in sql
+    assert params == {"stale_seconds": 30}
+
+
+@pytest.mark.anyio
+async def test_copied_chunks_stay_hidden_until_commit(tmp_path, monkeypatch):
+    from services.numpy_index import NumpyVectorIndex
+
+    index = NumpyVectorIndex(str(tmp_path / "index"), dimensions=2)
+    monkeypatch.setattr(ingestion.numpy_index, "enabled", lambda: True)
+    monkeypatch.setattr(ingestion.numpy_index, "get_index", lambda: index)
+    copies = [(uuid.uuid4(), [1.0, 0.0]), (uuid.uuid4(), [0.0, 1.0])]
+
+    class CopySession:
+        def __init__(self):
+            self.info: dict = {}
+
+        async def execute(self, statement, params):
+            class Result:
+                def all(self):
+                    return copies
+
+            return Result()
+
+    db = CopySession()
+    assert await ingestion.copy_chunks(db, uuid.uuid4(), uuid.uuid4()) == 2
+    assert len(index) == 0
+
+    ingestion.activate_committed_rows(db)
+    assert len(index) == 2
+    assert db.info == {}
@@ -0,0 +1,30 @@
+from services.llm import SYSTEM, _build_messages, _system
+
+
+def _history(n: int) -> list[dict]:
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"} for i in range(n)]
+
+
+def test_cached_prefix_is_stable_across_turns():
+    history = _history(6)
+    turn = _build_messages("Next question", "context A", history, True)
+    next_turn = _build_messages("Another", "context B", history + _history(8)[6:], True)
+
+    assert turn[-2]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+    assert "context A" in turn[-1]["content"]
+    # Earlier messages are unchanged apart from the moved breakpoint
+    for before, after in zip(turn[:-2], next_turn):
+        assert before == after
+    assert SYSTEM[0]["cache_control"] == {"type": "ephemeral"}
+
+
+def test_no_history_has_no_message_breakpoint():
+    messages = _build_messages("Hello", "", None, False)
+    assert messages == [{"role": "user", "content": "Hello"}]
+
+
+def test_summary_follows_cached_system_prompt():
+    assert _system(None) == SYSTEM
+    system = _system("The parties are Acme and Beta.")
+    assert system[0] == SYSTEM[0]
+    assert "Acme and Beta" in system[1]["text"]
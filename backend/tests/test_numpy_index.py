@@ -0,0 +1,65 @@
+import uuid
+
+import numpy as np
+import pytest
+
+from services.numpy_index import NumpyVectorIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    return NumpyVectorIndex(str(tmp_path / "index"), dimensions=4)
+
+
+def _add(index, doc_id, vectors, activate=True):
+    chunk_ids = [uuid.uuid4() for _ in vectors]
+    rows = index.add(chunk_ids, [doc_id] * len(vectors), vectors)
+    if activate:
+        index.activate(rows)
+    return chunk_ids
+
+
+def test_search_returns_nearest_first(index):
+    doc = uuid.uuid4()
+    ids = _add(index, doc, [[1, 0, 0, 0], [0, 1, 0, 0], [0.9, 0.1, 0, 0]])
+    hits = index.search([1, 0, 0, 0], k=2)
+    assert [cid for cid, _ in hits] == [ids[0], ids[2]]
+    assert hits[0][1] == pytest.approx(1.0)
+
+
+def test_rows_hidden_until_activated(index):
+    doc = uuid.uuid4()
+    _add(index, doc, [[1, 0, 0, 0]], activate=False)
+    assert index.search([1, 0, 0, 0], k=5) == []
+    assert len(index) == 0
+
+
+def test_document_filter_and_tombstones(index):
+    a, b = uuid.uuid4(), uuid.uuid4()
+    _add(index, a, [[1, 0, 0, 0]])
+    b_ids = _add(index, b, [[0.8, 0.2, 0, 0]])
+    assert [cid for cid, _ in index.search([1, 0, 0, 0], k=5, document_ids=[str(b)])] == b_ids
+
+    assert index.remove_document(a) == 1
+    assert [cid for cid, _ in index.search([1, 0, 0, 0], k=5)] == b_ids
+
+
+def test_reopen_maps_existing_rows_and_compacts(index):
+    a, b = uuid.uuid4(), uuid.uuid4()
+    _add(index, a, [[1, 0, 0, 0]] * 3)
+    b_ids = _add(index, b, [[0, 1, 0, 0]])
+    index.remove_document(a)
+
+    reopened = NumpyVectorIndex(index.path, dimensions=4)
+    assert reopened.count == 4 and len(reopened) == 1
+    assert reopened.compact() == 3
+    assert reopened.count == 1
+    assert [cid for cid, _ in reopened.search([0, 1, 0, 0], k=3)] == b_ids
+
+
+def test_interrupted_append_is_truncated(index):
+    _add(index, uuid.uuid4(), [[1, 0, 0, 0]])
+    with open(index._file("vectors.f32"), "ab") as f:
+        f.write(np.zeros(4, dtype=np.float32).tobytes())
+    reopened = NumpyVectorIndex(index.path, dimensions=4)
+    assert reopened.count == 1
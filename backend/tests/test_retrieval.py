@@ -0,0 +1,153 @@
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+
+from services import metrics, retrieval
+from services.retrieval import _rrf_fuse
+
+
+def _hit(cid: str) -> dict:
+    return {"chunk_id": cid, "content": cid, "score": 0.0}
+
+
+def test_rrf_rewards_chunks_found_by_both_searches():
+    vector = [_hit("a"), _hit("b"), _hit("c")]
+    keyword = [_hit("c"), _hit("d")]
+    fused = _rrf_fuse([vector, keyword], limit=3)
+    assert [r["chunk_id"] for r in fused] == ["c", "a", "b"]
+    assert fused[0]["score"] == 1 / 63 + 1 / 61
+
+
+def test_rrf_respects_limit():
+    assert len(_rrf_fuse([[_hit(str(i)) for i in range(10)]], limit=4)) == 4
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_concurrent_mode_overlaps_embedding_and_keyword_search(monkeypatch):
+    async def slow_embedding(query):
+        await asyncio.sleep(0.1)
+        return [0.0]
+
+    async def vector_search(embedding, db, limit, document_ids):
+        return [_hit("a")]
+
+    async def keyword_search(query, db, limit, document_ids):
+        await asyncio.sleep(0.1)
+        return [_hit("b")]
+
+    @asynccontextmanager
+    async def session():
+        yield None
+
+    monkeypatch.setattr(retrieval, "generate_embedding", slow_embedding)
+    monkeypatch.setattr(retrieval, "vector_search", vector_search)
+    monkeypatch.setattr(retrieval, "keyword_search", keyword_search)
+    monkeypatch.setattr(retrieval, "async_session", session)
+    monkeypatch.setattr(retrieval.settings, "hybrid_search_mode", "concurrent")
+    monkeypatch.setattr(retrieval.settings, "retrieval_cache_enabled", False)
+
+    start = time.perf_counter()
+    results = await retrieval.hybrid_search("indemnity", db=None, limit=2)
+    assert time.perf_counter() - start < 0.18
+    assert {r["chunk_id"] for r in results} == {"a", "b"}
+    assert metrics.get("retrieval.embedding.seconds.count") >= 1
+    assert metrics.get("retrieval.keyword_branch.seconds.count") >= 1
+
+
+@pytest.mark.anyio
+async def test_retrieval_cache_hits_until_corpus_version_changes(monkeypatch):
+    calls = []
+    version = 1
+
+    async def search(query, db, limit, document_ids, exact=None):
+        calls.append(query)
+        return [_hit("a")]
+
+    async def prepare(db, document_ids, candidates, read_version=False):
+        return False, version
+
+    monkeypatch.setattr(retrieval, "_hybrid_search", search)
+    monkeypatch.setattr(retrieval, "_prepare_vector_scan", prepare)
+    monkeypatch.setattr(retrieval, "_retrieval_cache", None)
+    monkeypatch.setattr(retrieval.settings, "retrieval_cache_enabled", True)
+
+    first = await retrieval.hybrid_search("Indemnity  clause", db=None, document_ids=["d2", "d1"])
+    first[0]["chunk_id"] = "mutated"
+    second = await retrieval.hybrid_search("indemnity clause", db=None, document_ids=["d1", "d2"])
+    assert second[0]["chunk_id"] == "a"
+    assert len(calls) == 1
+
+    await retrieval.hybrid_search("indemnity clause", db=None, limit=3, document_ids=["d1", "d2"])
+    assert len(calls) == 2
+
+    version = 2
+    await retrieval.hybrid_search("indemnity clause", db=None, document_ids=["d1", "d2"])
+    assert len(calls) == 3
+    assert retrieval.retrieval_cache_stats()["entries"] == 3
+
+
+def test_document_filter_binds_ids_as_one_array():
+    doc_id = "6f1c3c2e-4a8e-4c61-9a51-0f1f2b3c4d5e"
+    filters, params = retrieval._document_filter([doc_id])
+    assert filters == "AND dc.document_id = ANY(:document_ids)"
+    assert params == {"document_ids": [uuid.UUID(doc_id)]}
+    assert retrieval._document_filter(None) == ("", {})
+
+
+class _PreambleDb:
+    """Answers the scan setup statement, recording each one sent."""
+
+    def __init__(self, selected_chunks: int, version: int = 7):
+        self.row = {"selected_chunks": selected_chunks, "version": version}
+        self.statements: list[str] = []
+
+    async def execute(self, statement, params):
+        self.statements.append(str(statement))
+        row = self.row
+
+        class Result:
+            def mappings(self):
+                return self
+
+            def one(self):
+                return row
+
+        return Result()
+
+
+@pytest.mark.anyio
+async def test_exact_scan_chosen_for_small_selections(monkeypatch):
+    monkeypatch.setattr(retrieval.settings, "exact_search_max_chunks", 1000)
+    ids = [str(uuid.uuid4())]
+    assert (await retrieval._prepare_vector_scan(_PreambleDb(200), ids, 16))[0]
+    assert not (await retrieval._prepare_vector_scan(_PreambleDb(50_000), ids, 16))[0]
+    assert not (await retrieval._prepare_vector_scan(_PreambleDb(0), None, 16))[0]
+
+
+@pytest.mark.anyio
+async def test_scan_setup_and_version_read_share_one_statement():
+    db = _PreambleDb(200)
+    _, version = await retrieval._prepare_vector_scan(db, [str(uuid.uuid4())], 16, read_version=True)
+
+    assert version == 7
+    assert len(db.statements) == 1
+    sql = db.statements[0]
+    assert "hnsw.ef_search" in sql and "sum(chunk_count)" in sql and "corpus_state" in sql
+
+
+def test_short_mode_scores_unbackfilled_chunks_exactly(monkeypatch):
+    monkeypatch.setattr(retrieval.settings, "vector_quantization", "short")
+    sql = retrieval._vector_candidates_sql("", exact=False)
+    assert "ORDER BY dc.embedding_short <=>" in sql
+    assert "UNION ALL" in sql
+    assert "dc.embedding_short IS NULL AND dc.embedding IS NOT NULL" in sql
+    monkeypatch.setattr(retrieval.settings, "vector_quantization", "halfvec")
+    assert "UNION ALL" not in retrieval._vector_candidates_sql("", exact=False)
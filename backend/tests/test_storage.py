@@ -0,0 +1,87 @@
+import hashlib
+import io
+import os
+import tempfile
+import zipfile
+
+import pytest
+
+from fastapi import UploadFile
+
+from services.storage import UnreadableMemberError, UploadTooLargeError, iter_zip_members, save_stream
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+async def _chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+@pytest.mark.anyio
+async def test_save_stream_writes_and_hashes():
+    with tempfile.TemporaryDirectory() as tmp:
+        dest = os.path.join(tmp, "doc.pdf")
+        stored = await save_stream(_chunks(b"hello ", b"world"), dest, max_bytes=1024)
+        assert stored.size == 11
+        assert stored.sha256 == hashlib.sha256(b"hello world").hexdigest()
+        with open(dest, "rb") as f:
+            assert f.read() == b"hello world"
+        assert os.listdir(tmp) == ["doc.pdf"]
+
+
+@pytest.mark.anyio
+async def test_save_stream_aborts_when_too_large():
+    with tempfile.TemporaryDirectory() as tmp:
+        dest = os.path.join(tmp, "doc.pdf")
+        with pytest.raises(UploadTooLargeError):
+            await save_stream(_chunks(b"x" * 10, b"x" * 10), dest, max_bytes=15)
+        assert os.listdir(tmp) == []
+
+
+@pytest.mark.anyio
+async def test_iter_zip_members_skips_folders_and_metadata():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        archive.writestr("room/", b"")
+        archive.writestr("room/a.pdf", b"pdf bytes")
+        archive.writestr("room/.DS_Store", b"junk")
+        archive.writestr("__MACOSX/room/._a.pdf", b"junk")
+        archive.writestr("b.docx", b"docx bytes")
+    buf.seek(0)
+
+    members = {}
+    async for name, chunks in iter_zip_members(UploadFile(buf, filename="room.zip")):
+        members[name] = b"".join([chunk async for chunk in chunks])
+    assert members == {"a.pdf": b"pdf bytes", "b.docx": b"docx bytes"}
+
+
+def _encrypt_flag(data: bytes, name: bytes) -> bytes:
+    """Mark one member as encrypted in both its local header and the central directory."""
+    data = bytearray(data)
+    for signature, flags_offset, name_offset in ((b"PK\x03\x04", 6, 30), (b"PK\x01\x02", 8, 46)):
+        pos = data.find(signature)
+        while data[pos + name_offset:pos + name_offset + len(name)] != name:
+            pos = data.find(signature, pos + 1)
+        data[pos + flags_offset] |= 0x1
+    return bytes(data)
+
+
+@pytest.mark.anyio
+async def test_unreadable_zip_member_raises_its_own_error():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        archive.writestr("a.pdf", b"pdf bytes")
+        archive.writestr("locked.pdf", b"secret")
+    data = _encrypt_flag(buf.getvalue(), b"locked.pdf")
+
+    results = {}
+    async for name, chunks in iter_zip_members(UploadFile(io.BytesIO(data), filename="room.zip")):
+        try:
+            results[name] = b"".join([chunk async for chunk in chunks])
+        except UnreadableMemberError:
+            results[name] = None
+    assert results == {"a.pdf": b"pdf bytes", "locked.pdf": None}
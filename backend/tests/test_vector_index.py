@@ -0,0 +1,154 @@
+from contextlib import asynccontextmanager
+
+import pytest
+
+from config import settings
+from services import vector_index
+from services.vector_index import _ivfflat_lists, index_definition, index_matches, quantized_order_by
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class FakeConnection:
+    """Records statements; the advisory lock is granted unless `locked`."""
+
+    def __init__(self, locked: bool = False):
+        self.locked = locked
+        self.statements: list[str] = []
+
+    async def execution_options(self, **options):
+        return self
+
+    async def scalar(self, statement, params=None):
+        self.statements.append(str(statement))
+        return not self.locked
+
+    async def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+
+        class Result:
+            rowcount = 0
+
+            def scalar(self):
+                return 1000
+
+        return Result()
+
+
+def _fake_engine(monkeypatch, conn: FakeConnection) -> None:
+    class Engine:
+        @asynccontextmanager
+        async def connect(self):
+            yield conn
+
+    monkeypatch.setattr(vector_index, "engine", Engine())
+
+
+def test_hnsw_definition_uses_params():
+    sql = index_definition("ix_test", "hnsw", m=24, ef_construction=128)
+    assert "CREATE INDEX CONCURRENTLY ix_test" in sql
+    assert "USING hnsw (embedding vector_cosine_ops)" in sql
+    assert "m = 24, ef_construction = 128" in sql
+
+
+def test_ivfflat_lists_scale_with_rows():
+    assert _ivfflat_lists(0) == 1
+    assert _ivfflat_lists(500_000) == 500
+    assert _ivfflat_lists(4_000_000) == 2000
+    assert "lists = 500" in index_definition("ix_test", "ivfflat", rows=500_000)
+
+
+def test_unknown_index_type_rejected():
+    with pytest.raises(ValueError):
+        index_definition("ix_test", "diskann")
+
+
+def test_quantized_definitions_index_an_expression(monkeypatch):
+    monkeypatch.setattr(settings, "embedding_dimensions", 1536)
+    sql = index_definition("ix_test", "hnsw", quantization="halfvec")
+    assert "USING hnsw ((embedding::halfvec(1536)) halfvec_cosine_ops)" in sql
+    sql = index_definition("ix_test", "hnsw", quantization="binary")
+    assert "USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops)" in sql
+
+
+def test_quantized_order_by_follows_setting(monkeypatch):
+    monkeypatch.setattr(settings, "vector_quantization", "none")
+    assert quantized_order_by() is None
+    monkeypatch.setattr(settings, "vector_quantization", "binary")
+    assert "<~>" in quantized_order_by()
+
+
+def test_index_matches_checks_the_indexed_expression(monkeypatch):
+    monkeypatch.setattr(settings, "embedding_dimensions", 1536)
+    full = "CREATE INDEX ix ON public.document_chunks USING hnsw (embedding vector_cosine_ops) WITH (m='16')"
+    short = "CREATE INDEX ix ON public.document_chunks USING hnsw (embedding_short vector_cosine_ops) WITH (m='16')"
+    half = (
+        "CREATE INDEX ix ON public.document_chunks "
+        "USING hnsw (((embedding)::halfvec(1536)) halfvec_cosine_ops) WITH (m='16')"
+    )
+    assert index_matches(full, "hnsw", "none")
+    assert not index_matches(full, "hnsw", "short")
+    assert index_matches(short, "hnsw", "short")
+    assert not index_matches(short, "hnsw", "none")
+    assert index_matches(half, "hnsw", "halfvec")
+    assert not index_matches(half, "ivfflat", "halfvec")
+
+
+@pytest.mark.anyio
+async def test_build_swaps_in_new_index_before_dropping_old(monkeypatch):
+    monkeypatch.setattr(settings, "vector_quantization", "none")
+    conn = FakeConnection()
+    _fake_engine(monkeypatch, conn)
+    await vector_index._build("hnsw")
+
+    ddl = [s for s in conn.statements if "INDEX" in s]
+    name = vector_index.INDEX_NAME
+    assert ddl[-3:] == [
+        f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_old",
+        f"ALTER INDEX {name}_new RENAME TO {name}",
+        f"DROP INDEX CONCURRENTLY IF EXISTS {name}_old",
+    ]
+    assert f"DROP INDEX CONCURRENTLY IF EXISTS {name}" not in ddl
+    # Session settings are reset before the connection returns to the pool
+    assert conn.statements[-3:-1] == ["RESET maintenance_work_mem", "RESET max_parallel_maintenance_workers"]
+    assert "pg_advisory_unlock" in conn.statements[-1]
+
+
+@pytest.mark.anyio
+async def test_failed_build_still_resets_session_settings(monkeypatch):
+    class FailingConnection(FakeConnection):
+        async def execute(self, statement, params=None):
+            if str(statement).startswith("CREATE INDEX"):
+                raise RuntimeError("could not extend file")
+            return await super().execute(statement, params)
+
+    conn = FailingConnection()
+    _fake_engine(monkeypatch, conn)
+    with pytest.raises(RuntimeError):
+        await vector_index._build("hnsw")
+    assert "RESET maintenance_work_mem" in conn.statements
+
+
+@pytest.mark.anyio
+async def test_build_skipped_while_another_process_holds_the_lock(monkeypatch):
+    conn = FakeConnection(locked=True)
+    _fake_engine(monkeypatch, conn)
+    await vector_index._build("hnsw")
+
+    assert len(conn.statements) == 1 and "pg_try_advisory_lock" in conn.statements[0]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("version, expected", [("0.7.4", False), ("0.8.0", True), ("0.10.1", True)])
+async def test_iterative_scan_follows_installed_version(monkeypatch, version, expected):
+    class VersionConnection(FakeConnection):
+        async def scalar(self, statement, params=None):
+            return version
+
+    _fake_engine(monkeypatch, VersionConnection())
+    monkeypatch.setattr(vector_index, "_extension_version", ())
+    await vector_index.detect_extension()
+    assert vector_index.iterative_scan_supported() is expected
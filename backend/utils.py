@@ -5,3 +5,12 @@ _encoding = tiktoken.get_encoding("cl100k_base")
 
 def count_tokens(text: str) -> int:
     return len(_encoding.encode(text))
+
+
+def encode_batch(texts: list[str]) -> list[list[int]]:
+    """Tokenize many texts in one call (tiktoken spreads the work over threads)."""
+    return _encoding.encode_batch(texts)
+
+
+def decode(tokens: list[int]) -> str:
+    return _encoding.decode(tokens)
@@ -51,7 +51,13 @@ export default function Home() {
 
   const handleDeleteDocument = useCallback(
     async (id: string) => {
-      await deleteDocument(id);
+      try {
+        await deleteDocument(id);
+      } catch (err) {
+        // e.g. 409 while the document is still being ingested; keep it listed
+        console.error("Failed to delete document:", err);
+        return;
+      }
       setDocuments((prev) => prev.filter((d) => d.id !== id));
       if (previewDocument?.id === id) {
         setPreviewDocument(null);
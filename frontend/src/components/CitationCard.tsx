@@ -13,7 +13,11 @@ export default function CitationCard({ citation }: CitationCardProps) {
   const location = [
     citation.filename,
     citation.section,
-    citation.page_number ? `page ${citation.page_number}` : null,
+    citation.page_number
+      ? citation.page_end && citation.page_end !== citation.page_number
+        ? `pages ${citation.page_number}-${citation.page_end}`
+        : `page ${citation.page_number}`
+      : null,
   ]
     .filter(Boolean)
     .join(" | ");
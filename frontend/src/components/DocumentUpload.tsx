@@ -1,7 +1,7 @@
 "use client";
 
 import { useCallback, useState } from "react";
-import { uploadDocument, type Document } from "@/lib/api";
+import { uploadDocument, waitForIngestion, type Document } from "@/lib/api";
 
 interface DocumentUploadProps {
   onUploaded: (doc: Document) => void;
@@ -19,7 +19,8 @@ export default function DocumentUpload({ onUploaded }: DocumentUploadProps) {
       setUploading(true);
       try {
         for (const file of Array.from(files)) {
-          const doc = await uploadDocument(file);
+          const job = await uploadDocument(file);
+          const doc = await waitForIngestion(job.id);
           onUploaded(doc);
         }
       } catch (err: any) {
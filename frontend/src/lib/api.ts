@@ -7,9 +7,23 @@ export interface Document {
   file_size: number;
   page_count: number | null;
   chunk_count: number;
+  status: "processing" | "ready" | "failed";
   created_at: string;
 }
 
+export interface IngestionJob {
+  id: string;
+  document_id: string;
+  status: "queued" | "running" | "completed" | "failed";
+  stage: string | null;
+  pages_parsed: number;
+  chunks_total: number;
+  chunks_embedded: number;
+  rows_written: number;
+  error: string | null;
+  document: Document;
+}
+
 export interface Citation {
   number: number;
   document_id: string;
@@ -18,6 +32,8 @@ export interface Citation {
   page_number: number | null;
   section: string | null;
   chunk_id: string;
+  page_end?: number | null;
+  chunk_ids?: string[];
 }
 
 export interface Message {
@@ -43,7 +59,7 @@ export interface ConversationDetail {
 }
 
 // Documents
-export async function uploadDocument(file: File): Promise<Document> {
+export async function uploadDocument(file: File): Promise<IngestionJob> {
   const form = new FormData();
   form.append("file", file);
   const res = await fetch(`${BASE}/documents`, { method: "POST", body: form });
@@ -54,13 +70,32 @@ export async function uploadDocument(file: File): Promise<Document> {
   return res.json();
 }
 
+export async function getIngestionJob(id: string): Promise<IngestionJob> {
+  const res = await fetch(`${BASE}/documents/jobs/${id}`);
+  if (!res.ok) throw new Error("Failed to fetch ingestion status");
+  return res.json();
+}
+
+export async function waitForIngestion(id: string, intervalMs = 1000): Promise<Document> {
+  while (true) {
+    const job = await getIngestionJob(id);
+    if (job.status === "completed") return job.document;
+    if (job.status === "failed") throw new Error(job.error || "Processing failed");
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
+
 export async function listDocuments(): Promise<Document[]> {
   const res = await fetch(`${BASE}/documents`);
   return res.json();
 }
 
 export async function deleteDocument(id: string): Promise<void> {
-  await fetch(`${BASE}/documents/${id}`, { method: "DELETE" });
+  const res = await fetch(`${BASE}/documents/${id}`, { method: "DELETE" });
+  if (!res.ok) {
+    const err = await res.json().catch(() => ({ detail: "Failed to delete document" }));
+    throw new Error(err.detail || "Failed to delete document");
+  }
 }
 
 export async function createDocumentFromText(content: string, filename: string): Promise<Document> {